@@ -10,7 +10,7 @@ export default function App(){
   const [active,setActive] = React.useState('New')
   const [search,setSearch] = React.useState({currentSessionId:null,title:'',messages:[],historyItems:[],isLoading:false,error:null,cancelNoticeTs:0})
   const [sessions,setSessions] = React.useState([])
-  const [poll,setPoll] = React.useState({taskId:null,timer:null})
+  const [poll,setPoll] = React.useState({controller:null})
 
 
   const saveSessionLocal = (session)=>{
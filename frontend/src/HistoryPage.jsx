@@ -1,5 +1,5 @@
 import React from 'react'
-import { getSessions, getHistories, deleteSession, cancelTask } from './api.js'
+import { getSessions, getHistories, deleteSession } from './api.js'
 import Icons from './Icons.jsx'
 
 function HistoryPage({ setActive, search, setSearch, sessions, setSessions, poll, setPoll }) {
@@ -32,9 +32,8 @@ function HistoryPage({ setActive, search, setSearch, sessions, setSessions, poll
       await deleteSession(id)
       setSessions((sessions || []).filter(x => x.id !== id))
       if (search.currentSessionId === id) {
-        try { if (poll.taskId) { cancelTask(poll.taskId).catch(() => {}) } } catch (e) {}
-        try { poll.timer && clearInterval(poll.timer) } catch (e) {}
-        setPoll({ taskId: null, timer: null })
+        try { poll.controller && poll.controller.abort() } catch (e) {}
+        setPoll({ controller: null })
         setSearch({ currentSessionId: null, title: '', messages: [], historyItems: [], isLoading: false, error: null, cancelNoticeTs: 0 })
         setActive('New')
       }
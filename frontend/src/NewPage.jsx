@@ -1,5 +1,5 @@
 import React from 'react'
-import { createSession, createTask, getTask, cancelTask } from './api.js'
+import { createSession, streamSearch } from './api.js'
 import { debounce } from './api.js'
 import Icons from './Icons.jsx'
 
@@ -9,9 +9,8 @@ function NewPage({ setActive, search, setSearch, poll, setPoll, saveSessionLocal
 
   const submit = async () => {
     try {
-      try { if (poll.taskId) { cancelTask(poll.taskId).catch(() => {}) } } catch (e) {}
-      try { poll.timer && clearInterval(poll.timer) } catch (e) {}
-      setPoll({ taskId: null, timer: null })
+      try { poll.controller && poll.controller.abort() } catch (e) {}
+      setPoll({ controller: null })
 
       setSearch({ currentSessionId: null, title: '', messages: [], historyItems: [], isLoading: true, error: null, cancelNoticeTs: 0 })
       const session = await createSession()
@@ -19,29 +18,31 @@ function NewPage({ setActive, search, setSearch, poll, setPoll, saveSessionLocal
       setSearch({ currentSessionId: session.id, title: title, messages: [{ role: 'user', text: title }], historyItems: [], isLoading: true, error: null, cancelNoticeTs: 0 })
       setTitle('')
       setActive('Search')
-      const created = await createTask(title, session.id)
-      const taskId = created.task_id
-      const timer = setInterval(async () => {
-        try {
-          const st = await getTask(taskId)
-          if (st.status === 'done') {
-            clearInterval(timer)
-            setPoll({ taskId: null, timer: null })
-            setSearch(s => ({ ...s, isLoading: false, messages: [...s.messages, { role: 'bot', text: st.answer || '' }], historyItems: [...s.historyItems, { id: st.history_id, user_input: title, answer: st.answer || '' }] }))
-            saveHistoryLocal(session.id, title, st.answer || '')
-          } else if (st.status === 'error') {
-            clearInterval(timer)
-            setPoll({ taskId: null, timer: null })
-            setSearch(s => ({ ...s, isLoading: false, error: st.error || 'Task failed' }))
+      const controller = new AbortController()
+      setPoll({ controller })
+      let streaming = false
+      try {
+        await streamSearch(title, session.id, (event, data) => {
+          if (event === 'token') {
+            const first = !streaming
+            streaming = true
+            setSearch(s => ({ ...s, messages: first ? [...s.messages, { role: 'bot', text: data.text }] : [...s.messages.slice(0, -1), { role: 'bot', text: s.messages[s.messages.length - 1].text + data.text }] }))
+          } else if (event === 'done') {
+            const answer = data.answer || ''
+            setSearch(s => ({ ...s, isLoading: false, messages: [...(streaming ? s.messages.slice(0, -1) : s.messages), { role: 'bot', text: answer }], historyItems: [...s.historyItems, { id: data.history_id, user_input: title, answer }] }))
+            saveHistoryLocal(session.id, title, answer)
+          } else if (event === 'error') {
+            setSearch(s => ({ ...s, isLoading: false, error: data.error || 'Task failed' }))
           }
-        } catch (e) {
-          clearInterval(timer)
-          setPoll({ taskId: null, timer: null })
-          setSearch(s => ({ ...s, isLoading: false, error: 'Failed to get task status: ' + e.message }))
+        }, controller.signal)
+      } finally {
+        if (!controller.signal.aborted) {
+          setSearch(s => ({ ...s, isLoading: false }))
+          setPoll(p => p.controller === controller ? { controller: null } : p)
         }
-      }, 1000)
-      setPoll({ taskId, timer })
+      }
     } catch (e) {
+      if (e && e.name === 'AbortError') return
       setSearch(s => ({ ...s, isLoading: false, error: String(e && e.message ? e.message : e) }))
     }
   }
@@ -1,5 +1,5 @@
 import React from 'react'
-import { createTask, getTask, cancelTask } from './api.js'
+import { streamSearch } from './api.js'
 import { debounce, renderMarkdown } from './api.js'
 import Icons from './Icons.jsx'
 import NewPage from './NewPage.jsx'
@@ -19,41 +19,42 @@ function SearchPage({ setActive, search, setSearch, poll, setPoll, saveSessionLo
     if (!currentSessionId) return
     const text = input.trim()
     if (!text) return
-    try { if (poll.taskId) { cancelTask(poll.taskId).catch(() => {}) } } catch (e) {}
-    try { poll.timer && clearInterval(poll.timer) } catch (e) {}
-    setPoll({ taskId: null, timer: null })
+    try { poll.controller && poll.controller.abort() } catch (e) {}
+    const controller = new AbortController()
+    setPoll({ controller })
     setSearch(s => ({ ...s, title: text, messages: [...s.messages, { role: 'user', text }], isLoading: true }))
     setInput('')
-    const created = await createTask(text, currentSessionId)
-    const taskId = created.task_id
-    const timer = setInterval(async () => {
-      try {
-        const st = await getTask(taskId)
-        if (st.status === 'done') {
-          clearInterval(timer)
-          setPoll({ taskId: null, timer: null })
-          setSearch(s => ({ ...s, isLoading: false, messages: [...s.messages, { role: 'bot', text: st.answer || '' }], historyItems: [...s.historyItems, { id: st.history_id, user_input: text, answer: st.answer || '' }] }))
-          saveHistoryLocal(currentSessionId, text, st.answer || '')
-        } else if (st.status === 'error') {
-          clearInterval(timer)
-          setPoll({ taskId: null, timer: null })
-          setSearch(s => ({ ...s, isLoading: false, error: st.error || 'Task failed' }))
+    // Summary tokens are shown as they arrive, the final answer replaces them once the safety check is done
+    let streaming = false
+    try {
+      await streamSearch(text, currentSessionId, (event, data) => {
+        if (event === 'token') {
+          const first = !streaming
+          streaming = true
+          setSearch(s => ({ ...s, messages: first ? [...s.messages, { role: 'bot', text: data.text }] : [...s.messages.slice(0, -1), { role: 'bot', text: s.messages[s.messages.length - 1].text + data.text }] }))
+        } else if (event === 'done') {
+          const answer = data.answer || ''
+          setSearch(s => ({ ...s, isLoading: false, messages: [...(streaming ? s.messages.slice(0, -1) : s.messages), { role: 'bot', text: answer }], historyItems: [...s.historyItems, { id: data.history_id, user_input: text, answer }] }))
+          saveHistoryLocal(currentSessionId, text, answer)
+        } else if (event === 'error') {
+          setSearch(s => ({ ...s, isLoading: false, error: data.error || 'Task failed' }))
         }
-      } catch (e) {
-        clearInterval(timer)
-        setPoll({ taskId: null, timer: null })
-        setSearch(s => ({ ...s, isLoading: false, error: 'Failed to get task status: ' + e.message }))
+      }, controller.signal)
+    } catch (e) {
+      if (!controller.signal.aborted) setSearch(s => ({ ...s, isLoading: false, error: 'Search failed: ' + e.message }))
+    } finally {
+      if (!controller.signal.aborted) {
+        setSearch(s => ({ ...s, isLoading: false }))
+        setPoll(p => p.controller === controller ? { controller: null } : p)
       }
-    }, 1000)
-    setPoll({ taskId, timer })
+    }
   }
 
   const debouncedSubmit = React.useMemo(() => debounce(submit, 150), [currentSessionId, input])
 
   const cancel = () => {
-    try { if (poll.taskId) { cancelTask(poll.taskId).catch(() => {}) } } catch (e) {}
-    try { poll.timer && clearInterval(poll.timer) } catch (e) {}
-    setPoll({ taskId: null, timer: null })
+    try { poll.controller && poll.controller.abort() } catch (e) {}
+    setPoll({ controller: null })
     setSearch(s => ({ ...s, isLoading: false, cancelNoticeTs: Date.now(), error: null }))
   }
 
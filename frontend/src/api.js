@@ -32,6 +32,37 @@ export async function cancelTask(taskId){
   return r.json()
 }
 
+// Run a search and call onEvent(event, data) for each server-sent event, resolves once the stream ends
+export async function streamSearch(query,sessionId,onEvent,signal){
+  const r = await fetch(`${API_BASE}/search/stream`,{
+    method:'POST',
+    headers:{'Content-Type':'application/json','Accept':'text/event-stream'},
+    body: JSON.stringify({query,session_id:sessionId}),
+    signal
+  })
+  if(r.status === 429) throw new Error('server_busy')
+  if(!r.ok || !r.body) throw new Error('stream_failed')
+  const reader = r.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  for(;;){
+    const { value, done } = await reader.read()
+    if(done) break
+    buffer += decoder.decode(value,{stream:true})
+    let idx
+    while((idx = buffer.indexOf('\n\n')) >= 0){
+      const frame = buffer.slice(0,idx)
+      buffer = buffer.slice(idx+2)
+      let event = 'message', data = ''
+      frame.split('\n').forEach(line => {
+        if(line.startsWith('event:')) event = line.slice(6).trim()
+        else if(line.startsWith('data:')) data += line.slice(5).trim()
+      })
+      if(data) onEvent(event, JSON.parse(data))
+    }
+  }
+}
+
 export async function getSessions(){
   const r = await fetch(`${API_BASE}/sessions`)
   if(!r.ok) throw new Error('list_failed')
@@ -44,6 +75,13 @@ export async function getHistories(sessionId){
   return r.json()
 }
 
+export async function searchHistories(q,limit=20,offset=0){
+  const params = new URLSearchParams({q,limit:String(limit),offset:String(offset)})
+  const r = await fetch(`${API_BASE}/histories/search?${params}`)
+  if(!r.ok) throw new Error('hist_search_failed')
+  return r.json()
+}
+
 export async function deleteSession(id){
   const r = await fetch(`${API_BASE}/sessions/${id}`,{method:'DELETE'})
   if(!r.ok) throw new Error('del_session_failed')
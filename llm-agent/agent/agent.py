@@ -1,24 +1,27 @@
+import asyncio
 import operator
 from datetime import datetime
-from typing import Annotated, Literal, Any, Optional
+from typing import Annotated, Literal, Any, Optional, AsyncIterator
 import os
 
 from dotenv import load_dotenv
 from langchain.messages import SystemMessage, HumanMessage
 from langchain_core.messages import AIMessage
 from langchain_core.tools import StructuredTool
+from langchain_core.utils.json import parse_partial_json
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.constants import START, END
 from langgraph.graph import StateGraph
 from pydantic import BaseModel, Field
 
-from agent.rpc_client import RpcClient, zero_client, Result
+from agent.context import ContextBuilder
+from agent.registry import EngineRegistry
+from agent.rpc_client import rpc_client, Result
 from agent.tools import tools_by_name, tools_signatures
 from agent.prompts import SEARCH_PROMPT_TEMPLATE, SUMMARIZE_PROMPT, SAFETY_CHECK_PROMPT
 from model.history import History
 from model.session import Session
-
-rpc_client = RpcClient(zero_client)
+from model.store import store
 
 
 class AgentState(BaseModel):
@@ -28,6 +31,8 @@ class AgentState(BaseModel):
     available_engines: dict[str, str] | None = None
     # Search results
     search_results: Annotated[list, operator.add] = []
+    # Keys of the result chunks already shown to search_call
+    sent_results: Annotated[list[str], operator.add] = []
     # Generated content
     messages: Annotated[list, operator.add] = []
     answer: str | None = None
@@ -59,18 +64,36 @@ summarizer = llm.with_structured_output(Summary)
 checker = llm.with_structured_output(Safety)
 
 
+HISTORY_TURNS = 3
+
+
 async def trim_history(state: AgentState) -> dict:
     """Trim history to the last 3 interactions."""
-    if len(state.history) > 3:
-        state.history = state.history[-3:]
+    if len(state.history) > HISTORY_TURNS:
+        state.history = state.history[-HISTORY_TURNS:]
     return {"history": state.history}
 
 
+engine_registry = EngineRegistry(rpc_client, ttl=float(os.environ.get("ENGINES_TTL", "300")))
+
+
 async def list_available_engines(state: AgentState) -> dict:
-    return {"available_engines": await rpc_client.list_available_engines()}
+    return {"available_engines": await engine_registry.get()}
+
+
+search_context = ContextBuilder(budget=int(os.environ.get("SEARCH_CONTEXT_TOKENS", "6000")))
+summary_context = ContextBuilder(budget=int(os.environ.get("SUMMARY_CONTEXT_TOKENS", "24000")))
 
 
 async def search_call(state: AgentState) -> dict:
+    # Only results not shown in a previous iteration are sent in full, earlier ones are listed by source
+    context, used = search_context.build(state.search_results, exclude=set(state.sent_results))
+    sent = set(state.sent_results)
+    reviewed = ""
+    if sent:
+        sources = sorted({f"- {chunk.title}: {chunk.url}" for chunk in search_context.chunks(state.search_results)
+                          if chunk.key in sent})
+        reviewed = "\n### Already reviewed sources\n" + "\n".join(sources)
     # Include history in the prompt if available
     history = ""
     if state.history:
@@ -83,29 +106,33 @@ async def search_call(state: AgentState) -> dict:
             content=SEARCH_PROMPT_TEMPLATE + f"**Current Time:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}" + history),
         HumanMessage(content=f"""User input: {state.user_input}
         Available engines: {state.available_engines}"""),
-        HumanMessage(
-            content=(
-                    "### Search results before"
-                    + "\n".join(
-                [
-                    f"**{i + 1}. {res['title']}**\n"
-                    f"> {res['content']}\n"
-                    for i, res in enumerate(state.search_results)
-                ]
-            )
-            )
-        )
+        HumanMessage(content="### Search results before\n" + context + reviewed)
     ])
-    return {"messages": [msg]}
+    return {"messages": [msg], "sent_results": [chunk.key for chunk in used]}
+
+
+_tool_concurrency = int(os.environ.get("TOOL_CONCURRENCY", "5"))
+_tool_timeout = float(os.environ.get("TOOL_TIMEOUT", "180"))
 
 
 async def tool_node(state: AgentState) -> dict:
-    result = []
-    for tool_call in state.messages[-1].tool_calls:
+    """Run the tool calls concurrently, keeping their results in call order."""
+    semaphore = asyncio.Semaphore(_tool_concurrency)
+
+    async def call(tool_call: dict) -> Result | dict:
         tool = tools_by_name[tool_call["name"]]
-        observation: Result = await tool(**tool_call["args"])
-        result.append(observation)
-    return {"search_results": result}
+        async with semaphore:
+            target = next(iter(tool_call["args"].values()), tool_call["name"])
+            try:
+                return await asyncio.wait_for(tool(**tool_call["args"], timeout=_tool_timeout), _tool_timeout)
+            except asyncio.TimeoutError:
+                return {"title": f"{target} (timed out after {_tool_timeout:.0f}s)", "content": []}
+            except Exception as e:
+                # One failing call must not fail the node while its siblings keep running
+                return {"title": f"{target} (failed: {e})", "content": []}
+
+    result = await asyncio.gather(*[call(tool_call) for tool_call in state.messages[-1].tool_calls])
+    return {"search_results": list(result)}
 
 
 async def should_continue(state: AgentState) -> Literal["tool_node", "summarize"]:
@@ -124,16 +151,7 @@ async def summarize(state: AgentState) -> dict[str, Any]:
     prompt = [
         SystemMessage(content=SUMMARIZE_PROMPT ),
         HumanMessage(content=f"""User input: {state.user_input}"""),
-        HumanMessage(
-            content=(
-                    "### Search Results"
-                    + "\n".join([
-                f"**{i + 1}. {res['title']}**\n"
-                f"> {res['content']}\n"
-                for i, res in enumerate(state.search_results)
-            ])
-            )
-        ),
+        HumanMessage(content="### Search Results\n" + summary_context.build(state.search_results)[0]),
         HumanMessage(content=history_content),
     ]
     summary_result = await summarizer.ainvoke(prompt)
@@ -184,16 +202,77 @@ builder.add_edge("update_history", END)
 agent = builder.compile()
 
 
-async def run(user_input: str, session_id: int):
+def _summary_delta(chunk, buffer: str) -> str:
+    """Append the text of a summarizer stream chunk, either structured output arguments or plain JSON text."""
+    for tool_call in getattr(chunk, "tool_call_chunks", None) or []:
+        buffer += tool_call.get("args") or ""
+    content = chunk.content
+    if isinstance(content, str):
+        return buffer + content
+    for part in content or []:
+        if isinstance(part, dict) and part.get("type") == "text":
+            buffer += part.get("text") or ""
+        elif isinstance(part, str):
+            buffer += part
+    return buffer
+
+
+def _start_interaction(session_id: int, user_input: str) -> History:
     history = History.create(session_id, user_input)
     # Update session abstract
     Session.update_abstract(session_id, user_input)
+    return history
+
+
+async def run_stream(user_input: str, session_id: int) -> AsyncIterator[tuple[str, dict]]:
+    """
+    Run the agent and yield its progress as (event, data) pairs:
+    - start: the history record was created
+    - node: a graph node started or ended
+    - results: a tool call returned search results
+    - token: new text of the summary, which the safety check may still replace
+    - done: the final answer, saved to the history
+    """
+    # Both writes are committed in the same transaction
+    history = await store.write(_start_interaction, session_id, user_input)
     # Read history from DB
-    histories = History.get_histories(session_id)
-    histories = [(h.user_input, h.answer or "") for h in histories if h.answer is not None]
-    state = await agent.ainvoke(AgentState(user_input=user_input, history=histories))
-    History.update_answer(history.id, state.get("answer"))
+    histories = await store.read(History.get_recent_answered, session_id, HISTORY_TURNS)
+    yield "start", {"history_id": history.id}
+
+    state, buffer, streamed = {}, "", ""
+    async for event in agent.astream_events(AgentState(user_input=user_input, history=histories), version="v2"):
+        kind, name = event["event"], event["name"]
+        node = event.get("metadata", {}).get("langgraph_node")
+        if not event.get("parent_ids"):
+            if kind == "on_chain_end":
+                state = event["data"].get("output") or {}
+        elif kind in ("on_chain_start", "on_chain_end") and name in builder.nodes and name == node:
+            yield "node", {"node": name, "status": "start" if kind == "on_chain_start" else "end"}
+            if kind == "on_chain_end" and name == "tool_node":
+                for res in (event["data"].get("output") or {}).get("search_results", []):
+                    yield "results", {
+                        "title": res["title"],
+                        "urls": list(dict.fromkeys(item["url"] for item in res["content"] if item.get("url"))),
+                    }
+        elif kind == "on_chat_model_stream" and node == "summarize":
+            buffer = _summary_delta(event["data"]["chunk"], buffer)
+            parsed = parse_partial_json(buffer) if buffer.strip() else None
+            text = parsed.get("content") if isinstance(parsed, dict) else None
+            if isinstance(text, str) and text.startswith(streamed) and len(text) > len(streamed):
+                yield "token", {"text": text[len(streamed):]}
+                streamed = text
+
+    answer = state.get("answer")
+    await store.write(History.update_answer, history.id, answer)
+    yield "done", {"answer": answer, "history_id": history.id}
+
+
+async def run(user_input: str, session_id: int):
+    result = {}
+    async for event, data in run_stream(user_input, session_id):
+        if event == "done":
+            result = data
     return {
-        "answer": state.get('answer'),
-        "history_id": history.id,
+        "answer": result.get("answer"),
+        "history_id": result.get("history_id"),
     }
@@ -0,0 +1,70 @@
+import hashlib
+import re
+from dataclasses import dataclass, field
+
+_CJK = re.compile("[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: one token per CJK character, one per four other characters."""
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+@dataclass
+class Chunk:
+    key: str
+    title: str
+    url: str
+    content: str
+    score: float = 0.0
+    sources: set[str] = field(default_factory=set)
+
+    def render(self, index: int) -> str:
+        url = f"\nURL: {self.url}" if self.url else ""
+        return f"**{index}. {self.title}**{url}\n> {self.content}\n"
+
+
+class ContextBuilder:
+    """
+    Turn the accumulated tool results into prompt context within a token budget.
+    Chunks are deduplicated by content hash, ranked by reciprocal rank summed over the results that
+    returned them (k as in reciprocal rank fusion), and cut once the budget is spent.
+    """
+
+    def __init__(self, budget: int, k: int = 10):
+        self.budget = budget
+        self.k = k
+
+    def chunks(self, results: list) -> list[Chunk]:
+        chunks: dict[str, Chunk] = {}
+        for i, res in enumerate(results):
+            for rank, item in enumerate(res.get("content") or []):
+                content = (item.get("content") or "").strip()
+                if not content:
+                    continue
+                key = hashlib.sha1(" ".join(content.split()).encode("utf-8")).hexdigest()
+                chunk = chunks.setdefault(key, Chunk(key=key, title=res.get("title") or "",
+                                                     url=item.get("url") or "", content=content))
+                source = f"{i}:{res.get('title')}"
+                if source not in chunk.sources:
+                    chunk.sources.add(source)
+                    chunk.score += 1 / (self.k + rank + 1)
+        return sorted(chunks.values(), key=lambda c: c.score, reverse=True)
+
+    def build(self, results: list, exclude: set[str] | frozenset = frozenset()) -> tuple[str, list[Chunk]]:
+        """
+        Render the best chunks not in `exclude` that fit in the budget, return the text and the chunks used.
+        """
+        lines, used, spent = [], [], 0
+        for chunk in self.chunks(results):
+            if chunk.key in exclude:
+                continue
+            text = chunk.render(len(used) + 1)
+            cost = estimate_tokens(text)
+            if spent + cost > self.budget:
+                continue
+            lines.append(text)
+            used.append(chunk)
+            spent += cost
+        return "\n".join(lines), used
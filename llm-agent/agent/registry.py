@@ -0,0 +1,51 @@
+import asyncio
+import logging
+import time
+
+from agent.rpc_client import RpcClient
+
+
+class EngineRegistry:
+    """
+    Cached list of the search engines available on the search server.
+    The list is loaded once, then revalidated in the background every `ttl` seconds by comparing the
+    server's engines version, so requests never wait for the search server once it is loaded.
+    """
+
+    def __init__(self, client: RpcClient, ttl: float = 300):
+        self.client = client
+        self.ttl = ttl
+        self.logger = logging.getLogger(__name__)
+        self._engines: dict[str, str] | None = None
+        self._version: str | None = None
+        self._expires = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh: asyncio.Task | None = None
+
+    async def get(self) -> dict[str, str]:
+        if self._engines is None:
+            async with self._lock:
+                if self._engines is None:
+                    await self._load()
+        elif time.monotonic() >= self._expires and (self._refresh is None or self._refresh.done()):
+            self._refresh = asyncio.create_task(self._revalidate())
+        return self._engines
+
+    async def _load(self):
+        version = await self.client.engines_version()
+        self._engines = await self.client.list_available_engines()
+        self._version = version
+        self._expires = time.monotonic() + self.ttl
+
+    async def _revalidate(self):
+        try:
+            async with self._lock:
+                if await self.client.engines_version() != self._version:
+                    await self._load()
+                    self.logger.info("Available engines changed, registry refreshed")
+                else:
+                    self._expires = time.monotonic() + self.ttl
+        except Exception as e:
+            # Keep serving the cached list and retry later
+            self._expires = time.monotonic() + min(self.ttl, 30)
+            self.logger.warning(f"Failed to revalidate available engines: {e}")
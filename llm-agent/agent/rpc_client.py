@@ -1,18 +1,24 @@
 # Generated by Zero
 # import types as per needed, not all imports are shown here
+import itertools
+import logging
+import time
+import uuid
+from typing import AsyncIterator, Any
+
 from msgspec import Struct
 
-from zero import ZeroClient
+from zero import AsyncZeroClient
 import asyncio
 
-zero_client = ZeroClient("localhost", 5559, default_timeout=600_000)
-
 
 class SearchConfig(Struct):
     target: str
     preset: str = "default"
     preference: str = "balance"
     kwargs: dict = {}
+    request_id: str | None = None
+    deadline: float | None = None
 
 
 class Result(Struct):
@@ -20,18 +26,88 @@ class Result(Struct):
     content: list[dict[str, str]]
 
 
+class StreamCursor(Struct):
+    stream_id: str
+    seq: int = 0
+
+
+class StreamChunk(Struct):
+    stream_id: str
+    seq: int
+    done: bool
+    result: Result | None = None
+    error: str | None = None
+
+
 class RpcClient:
-    def __init__(self, _zero_client: ZeroClient):
-        self._zero_client = _zero_client
+    """
+    Async RPC client backed by a small pool of `AsyncZeroClient`s used round-robin.
+    Every call has a deadline (`timeout` seconds, `default_timeout` by default). Searches that are cancelled
+    or pass their deadline are cancelled on the search server as well.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 5559, pool_size: int = 4, default_timeout: float = 600):
+        self.default_timeout = default_timeout
+        self.logger = logging.getLogger(__name__)
+        self._clients = [
+            AsyncZeroClient(host, port, default_timeout=int(default_timeout * 1000) + 1000) for _ in range(pool_size)
+        ]
+        self._next = itertools.cycle(self._clients)
+        self._background: set[asyncio.Task] = set()
+
+    async def _call(self, name: str, msg: Any, timeout: float | None = None) -> Any:
+        timeout = timeout or self.default_timeout
+        # zero's own timeout is a little longer so that the deadline always surfaces as asyncio.TimeoutError
+        return await asyncio.wait_for(next(self._next).call(name, msg, timeout=int(timeout * 1000) + 1000), timeout)
+
+    def _cancel_remote(self, request_id: str):
+        task = asyncio.ensure_future(self._call("cancel", request_id, timeout=5))
+        self._background.add(task)
+        task.add_done_callback(self._cancel_done)
+
+    def _cancel_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception():
+            self.logger.warning(f"Failed to cancel search on the server: {task.exception()}")
+
+    async def echo(self, msg: str, timeout: float | None = None) -> str:
+        return await self._call("echo", msg, timeout)
+
+    async def fetch(self, url: str, timeout: float | None = None) -> Result:
+        return await self._call("fetch", url, timeout)
+
+    async def search(self, config: SearchConfig, timeout: float | None = None) -> Result:
+        timeout = timeout or self.default_timeout
+        config.request_id = config.request_id or uuid.uuid4().hex
+        config.deadline = time.time() + timeout
+        try:
+            return await self._call("search", config, timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            self._cancel_remote(config.request_id)
+            raise
+
+    async def list_available_engines(self, timeout: float | None = None) -> dict[str, str]:
+        return await self._call("list_available_engines", None, timeout)
 
-    async def echo(self, msg: str) -> str:
-        return await asyncio.to_thread(self._zero_client.call, "echo", msg)
+    async def engines_version(self, timeout: float | None = None) -> str:
+        return await self._call("engines_version", None, timeout)
 
-    async def fetch(self, url: str) -> Result:
-        return await asyncio.to_thread(self._zero_client.call, "fetch", url)
+    async def search_stream(self, config: SearchConfig, poll: float = 0.2) -> AsyncIterator[Result]:
+        """
+        Yield partial search results as the server produces them, the last one being complete.
+        The server answers each poll at once, `poll` is the number of seconds to wait after one without news.
+        """
+        chunk = await self._call("search_stream", config)
+        seq, done = chunk["seq"], chunk["done"]
+        while not done:
+            chunk = await self._call("search_stream_next", StreamCursor(stream_id=chunk["stream_id"], seq=seq))
+            if chunk.get("error"):
+                raise RuntimeError(chunk["error"])
+            if chunk.get("result") is not None:
+                yield chunk["result"]
+            elif not chunk["done"]:
+                await asyncio.sleep(poll)
+            seq, done = chunk["seq"], chunk["done"]
 
-    async def search(self, config: SearchConfig) -> Result:
-        return await asyncio.to_thread(self._zero_client.call, "search", config)
 
-    async def list_available_engines(self) -> dict[str, str]:
-        return await asyncio.to_thread(self._zero_client.call, "list_available_engines", None)
+rpc_client = RpcClient()
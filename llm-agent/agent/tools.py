@@ -2,7 +2,7 @@ from typing import Literal
 
 from pydantic import BaseModel, Field
 
-from agent.rpc_client import RpcClient, zero_client, SearchConfig, Result
+from agent.rpc_client import rpc_client, SearchConfig, Result
 
 
 class list_available_engines(BaseModel):
@@ -31,15 +31,15 @@ tools_signatures = [
     search,
 ]
 
-rpc_client = RpcClient(zero_client)
 
+async def _fetch_content(url: str, timeout: float | None = None) -> Result:
+    return await rpc_client.fetch(url, timeout=timeout)
 
-async def _fetch_content(url: str) -> Result:
-    return await rpc_client.fetch(url)
 
-
-async def _search(query: str, engine: str = "default", preference: str = "balance") -> Result:
-    return await rpc_client.search(SearchConfig(target=query, preset=engine, preference=preference))
+async def _search(query: str, engine: str = "default", preference: str = "balance",
+                  timeout: float | None = None) -> Result:
+    # The timeout also sets the search deadline, which the search server enforces itself
+    return await rpc_client.search(SearchConfig(target=query, preset=engine, preference=preference), timeout=timeout)
 
 
 tools_by_name = {
@@ -4,7 +4,12 @@ import os
 _BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 _DB_PATH = os.path.join(_BASE_DIR, '..', 'assets', 'database.db')
 db = SqliteDatabase(os.path.normpath(_DB_PATH), pragmas={
-    'foreign_keys': 1
+    'foreign_keys': 1,
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -64 * 1024,  # 64MB
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,
 })
 
 
@@ -1,6 +1,6 @@
 import time
 
-from peewee import IntegerField, TextField, ForeignKeyField
+from peewee import IntegerField, TextField, ForeignKeyField, Tuple
 
 from . import BaseModel, db
 from .session import Session
@@ -14,6 +14,9 @@ class History(BaseModel):
 
     class Meta:
         table_name = 'history'
+        indexes = (
+            (('session', 'timestamp'), False),
+        )
 
     @classmethod
     def create(cls, session_id: int, user_input: str, answer: str = None):
@@ -45,5 +48,114 @@ class History(BaseModel):
         return True
 
     @classmethod
-    def get_histories(cls, session_id: int):
-        return list(cls.select().where(cls.session == session_id))
+    def get_histories(cls, session_id: int, limit: int = None, before: int = None):
+        """
+        Histories of a session in chronological order. With `limit`, only the last `limit` ones
+        older than the history `before`, so that pages can be fetched backwards from the newest.
+        """
+        query = cls.select().where(cls.session == session_id)
+        if before is not None:
+            cursor = cls.get_or_none(cls.id == before)
+            if not cursor:
+                return []
+            query = query.where(Tuple(cls.timestamp, cls.id) < Tuple(cursor.timestamp, cursor.id))
+        if limit is None:
+            return list(query.order_by(cls.timestamp, cls.id))
+        return list(reversed(query.order_by(cls.timestamp.desc(), cls.id.desc()).limit(limit)))
+
+    @classmethod
+    def get_recent_answered(cls, session_id: int, n: int):
+        """The last `n` answered interactions of a session as (user_input, answer), oldest first."""
+        query = (cls.select(cls.user_input, cls.answer)
+                 .where((cls.session == session_id) & cls.answer.is_null(False))
+                 .order_by(cls.timestamp.desc(), cls.id.desc())
+                 .limit(n))
+        return [(h.user_input, h.answer) for h in reversed(list(query))]
+
+    @classmethod
+    def create_search_index(cls):
+        """
+        Create the full-text index of user inputs and answers if needed, kept in sync by triggers.
+        The trigram tokenizer matches substrings, so text without spaces between words (e.g. Chinese) is searchable.
+        """
+        exists = db.execute_sql("SELECT 1 FROM sqlite_master WHERE name = 'history_fts'").fetchone()
+        db.execute_sql("CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5("
+                       "user_input, answer, content='history', content_rowid='id', tokenize='trigram')")
+        db.execute_sql("CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN "
+                       "INSERT INTO history_fts(rowid, user_input, answer) VALUES (new.id, new.user_input, new.answer); "
+                       "END")
+        db.execute_sql("CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN "
+                       "INSERT INTO history_fts(history_fts, rowid, user_input, answer) "
+                       "VALUES ('delete', old.id, old.user_input, old.answer); "
+                       "END")
+        db.execute_sql("CREATE TRIGGER IF NOT EXISTS history_fts_update AFTER UPDATE OF user_input, answer ON history BEGIN "
+                       "INSERT INTO history_fts(history_fts, rowid, user_input, answer) "
+                       "VALUES ('delete', old.id, old.user_input, old.answer); "
+                       "INSERT INTO history_fts(rowid, user_input, answer) VALUES (new.id, new.user_input, new.answer); "
+                       "END")
+        if not exists:
+            # Index the histories written before the index existed
+            db.execute_sql("INSERT INTO history_fts(history_fts) VALUES ('rebuild')")
+
+    @classmethod
+    def search(cls, text: str, limit: int = 20, offset: int = 0, scan_limit: int = 5000):
+        """
+        Histories matching every term of `text`, highlighted with ** in the snippets.
+        Terms of 3 characters or more go through the trigram index and rank results by bm25, user inputs
+        weighted twice as much as answers. Shorter terms (e.g. two-character Chinese words) cannot be
+        indexed by trigrams and filter rows by substring instead, newest first when no term is indexed.
+        Without any indexed term the substring scan is bounded to the newest `scan_limit` histories.
+        """
+        terms = text.split()
+        if not terms:
+            return []
+        long_terms = [term for term in terms if len(term) >= 3]
+        short_terms = [term.lower() for term in terms if len(term) < 3]
+        conditions, params = [], []
+        for term in short_terms:
+            conditions.append("(instr(lower(h.user_input), ?) > 0 OR instr(lower(coalesce(h.answer, '')), ?) > 0)")
+            params.extend([term, term])
+        if long_terms:
+            match = " ".join('"' + term.replace('"', '""') + '"' for term in long_terms)
+            sql = ("SELECT h.id, h.session_id, h.timestamp, "
+                   "snippet(history_fts, 0, '**', '**', '...', 32), snippet(history_fts, 1, '**', '**', '...', 32) "
+                   "FROM history_fts JOIN history h ON h.id = history_fts.rowid "
+                   "WHERE history_fts MATCH ?" + "".join(f" AND {c}" for c in conditions) +
+                   " ORDER BY bm25(history_fts, 2.0, 1.0) LIMIT ? OFFSET ?")
+            params = [match] + params
+        else:
+            sql = ("SELECT h.id, h.session_id, h.timestamp, h.user_input, h.answer "
+                   "FROM (SELECT * FROM history ORDER BY id DESC LIMIT ?) h "
+                   "WHERE " + " AND ".join(conditions) + " ORDER BY h.timestamp DESC, h.id DESC LIMIT ? OFFSET ?")
+            params = [scan_limit] + params
+        rows = db.execute_sql(sql, params + [limit, offset]).fetchall()
+        if not long_terms:
+            rows = [(id_, session_id, timestamp, _snippet(user_input, short_terms), _snippet(answer, short_terms))
+                    for id_, session_id, timestamp, user_input, answer in rows]
+        return [
+            {"id": id_, "session_id": session_id, "timestamp": timestamp, "user_input": user_input, "answer": answer}
+            for id_, session_id, timestamp, user_input, answer in rows
+        ]
+
+
+def _snippet(text: str | None, terms: list[str], width: int = 48) -> str:
+    """Excerpt of `text` around the first match of `terms`, with matches highlighted like FTS5 snippets."""
+    if not text:
+        return ""
+    lowered = text.lower()
+    positions = [pos for pos in (lowered.find(term) for term in terms) if pos >= 0]
+    start = max(0, min(positions) - width // 2) if positions else 0
+    end = min(len(text), start + width)
+    excerpt = text[start:end]
+    lowered = excerpt.lower()
+    marked, i = [], 0
+    while i < len(excerpt):
+        term = next((term for term in terms if lowered.startswith(term, i)), None)
+        if term:
+            marked.append(f"**{excerpt[i:i + len(term)]}**")
+            i += len(term)
+        else:
+            marked.append(excerpt[i])
+            i += 1
+    # Adjacent matches form a single highlight
+    return ("..." if start > 0 else "") + "".join(marked).replace("****", "") + ("..." if end < len(text) else "")
@@ -39,5 +39,11 @@ class Session(BaseModel):
         return True
 
     @classmethod
-    def get_sessions(cls):
-        return list(cls.select())
+    def get_sessions(cls, limit: int = None, before: int = None):
+        """Sessions from the newest, with `limit` only those older than the session `before`."""
+        query = cls.select().order_by(cls.id.desc())
+        if before is not None:
+            query = query.where(cls.id < before)
+        if limit is not None:
+            query = query.limit(limit)
+        return list(query)
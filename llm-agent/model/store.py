@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable
+
+from . import db
+
+
+class Store:
+    """
+    Runs every database call on one dedicated thread so that SQLite never blocks the event loop.
+    Reads run one at a time, writes queued together are committed in a single transaction
+    (up to `max_batch` of them), each in its own savepoint so that a failing write only fails itself.
+    """
+
+    def __init__(self, max_batch: int = 64):
+        self.max_batch = max_batch
+        self.logger = logging.getLogger(__name__)
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="db", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    async def read(self, fn: Callable, *args, **kwargs) -> Any:
+        return await self._submit(False, fn, args, kwargs)
+
+    async def write(self, fn: Callable, *args, **kwargs) -> Any:
+        return await self._submit(True, fn, args, kwargs)
+
+    async def _submit(self, write: bool, fn: Callable, args: tuple, kwargs: dict) -> Any:
+        self.start()
+        future = Future()
+        self._queue.put((write, fn, args, kwargs, future))
+        return await asyncio.wrap_future(future)
+
+    @staticmethod
+    def _run(fn: Callable, args: tuple, kwargs: dict, future: Future):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def _commit(self, batch: list):
+        # Results are only handed out once the whole batch is committed
+        outcomes = []
+        try:
+            with db.atomic():
+                for _, fn, args, kwargs, future in batch:
+                    try:
+                        with db.atomic():
+                            outcomes.append((True, fn(*args, **kwargs)))
+                    except Exception as e:
+                        outcomes.append((False, e))
+        except Exception as e:
+            self.logger.exception("Failed to commit writes")
+            outcomes = [(False, e)] * len(batch)
+        for (*_, future), (ok, value) in zip(batch, outcomes):
+            if future.set_running_or_notify_cancel():
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _loop(self):
+        db.connect(reuse_if_open=True)
+        pending = []
+        try:
+            while True:
+                item = pending.pop() if pending else self._queue.get()
+                if item is None:
+                    return
+                write, fn, args, kwargs, future = item
+                if not write:
+                    self._run(fn, args, kwargs, future)
+                    continue
+                batch = [item]
+                while len(batch) < self.max_batch:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None or not item[0]:
+                        pending.append(item)
+                        break
+                    batch.append(item)
+                self._commit(batch)
+        finally:
+            db.close()
+
+
+store = Store()
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+
+class QueueFull(Exception):
+    pass
+
+
+class TaskScheduler:
+    """
+    Runs agent tasks with a fixed pool of workers fed by a bounded queue.
+    - workers: number of tasks running at the same time
+    - max_queued: number of tasks waiting for a worker, `submit` raises `QueueFull` beyond it
+    - ttl: seconds a finished task record is kept for status queries
+    Waiting tasks are queued per session and sessions are served round-robin, so one session
+    submitting many tasks cannot starve the others.
+    """
+
+    def __init__(self, workers: int = 4, max_queued: int = 100, ttl: float = 3600):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.logger = logging.getLogger(__name__)
+        self.tasks: dict[str, dict] = {}
+        self._queues: dict[int, deque[str]] = {}
+        self._sessions: deque[int] = deque()
+        self._queued = 0
+        self._ready: asyncio.Condition | None = None
+        self._workers: list[asyncio.Task] = []
+        self._evictor: asyncio.Task | None = None
+
+    def start(self):
+        self._ready = asyncio.Condition()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._evictor = asyncio.create_task(self._evict())
+
+    async def stop(self):
+        for task in self._workers + [self._evictor]:
+            task.cancel()
+        for info in self.tasks.values():
+            if info["task"] and not info["task"].done():
+                info["task"].cancel()
+        await asyncio.gather(*self._workers, self._evictor, return_exceptions=True)
+
+    async def submit(self, session_id: int, fn: Callable[[], Awaitable[Any]]) -> str:
+        if self._queued >= self.max_queued:
+            raise QueueFull(f"{self._queued} tasks are already waiting")
+        tid = uuid.uuid4().hex
+        self.tasks[tid] = {"status": "queued", "result": None, "error": None, "task": None,
+                           "fn": fn, "session_id": session_id, "finished": None, "done": asyncio.Event()}
+        async with self._ready:
+            if session_id not in self._queues:
+                self._queues[session_id] = deque()
+                self._sessions.append(session_id)
+            self._queues[session_id].append(tid)
+            self._queued += 1
+            self._ready.notify()
+        return tid
+
+    def get(self, tid: str) -> dict | None:
+        return self.tasks.get(tid)
+
+    async def wait(self, tid: str):
+        info = self.tasks.get(tid)
+        if info:
+            await info["done"].wait()
+
+    def cancel(self, tid: str) -> str | None:
+        """Cancel a queued or running task, return its status or None if it is unknown."""
+        info = self.tasks.get(tid)
+        if not info:
+            return None
+        if info["status"] == "queued":
+            queue = self._queues.get(info["session_id"])
+            if queue and tid in queue:
+                queue.remove(tid)
+                self._queued -= 1
+                if not queue:
+                    del self._queues[info["session_id"]]
+                    self._sessions.remove(info["session_id"])
+            self._finish(info, "canceled")
+        elif info["status"] == "running" and info["task"] and not info["task"].done():
+            info["task"].cancel()
+        return info["status"]
+
+    def _finish(self, info: dict, status: str):
+        info["status"] = status
+        info["fn"] = None
+        info["task"] = None
+        info["finished"] = time.monotonic()
+        info["done"].set()
+
+    async def _next(self) -> str:
+        async with self._ready:
+            await self._ready.wait_for(lambda: self._queued > 0)
+            session_id = self._sessions.popleft()
+            queue = self._queues[session_id]
+            tid = queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._sessions.append(session_id)
+            else:
+                del self._queues[session_id]
+            return tid
+
+    async def _work(self):
+        while True:
+            tid = await self._next()
+            info = self.tasks[tid]
+            info["status"] = "running"
+            info["task"] = asyncio.create_task(info["fn"]())
+            try:
+                info["result"] = await asyncio.shield(info["task"])
+                self._finish(info, "done")
+            except asyncio.CancelledError:
+                if not info["task"].cancelled():
+                    # The worker itself is being stopped
+                    info["task"].cancel()
+                    self._finish(info, "canceled")
+                    raise
+                self._finish(info, "canceled")
+            except Exception as e:
+                self.logger.exception(f"Task {tid} failed")
+                info["error"] = str(e)
+                self._finish(info, "error")
+
+    async def _evict(self):
+        while True:
+            await asyncio.sleep(min(60.0, self.ttl))
+            expired = time.monotonic() - self.ttl
+            for tid in [tid for tid, info in self.tasks.items() if info["finished"] and info["finished"] < expired]:
+                del self.tasks[tid]
@@ -1,17 +1,19 @@
 from __future__ import annotations
 
 import os
-from fastapi import FastAPI, HTTPException, Form, Request
+from fastapi import FastAPI, HTTPException, Form, Request, Query
 from fastapi.staticfiles import StaticFiles
 import asyncio
-import uuid
-from fastapi.responses import JSONResponse
+import json
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from agent.agent import run
+from agent.agent import run, run_stream
 from model import db
 from model.history import History
 from model.session import Session
+from model.store import store
+from server.scheduler import TaskScheduler, QueueFull
 
 app = FastAPI(
     title="DeepSearch",
@@ -34,41 +36,30 @@ if os.path.isdir(_static_dir):
 async def root():
     return JSONResponse({"status": "ok"})
 
-tasks: dict[str, dict] = {}
-tasks_lock = asyncio.Lock()
+scheduler = TaskScheduler(
+    workers=int(os.environ.get("AGENT_WORKERS", "4")),
+    max_queued=int(os.environ.get("TASK_QUEUE_SIZE", "100")),
+    ttl=float(os.environ.get("TASK_TTL", "3600")),
+)
+
+
+async def submit(session_id: int, fn) -> str:
+    try:
+        return await scheduler.submit(session_id, fn)
+    except QueueFull:
+        raise HTTPException(status_code=429, detail="Too many pending tasks", headers={"Retry-After": "10"})
 
 @app.post("/api/tasks")
 async def create_task(request: Request):
     data = await request.json()
     query = data["query"]
     session_id = int(data["session_id"])
-    tid = uuid.uuid4().hex
-    async with tasks_lock:
-        tasks[tid] = {"status": "queued", "result": None, "error": None, "task": None}
-    async def worker():
-        async with tasks_lock:
-            tasks[tid]["status"] = "running"
-        try:
-            res = await run(query, session_id)
-            async with tasks_lock:
-                tasks[tid]["result"] = res
-                tasks[tid]["status"] = "done"
-        except asyncio.CancelledError:
-            async with tasks_lock:
-                tasks[tid]["status"] = "canceled"
-        except Exception as e:
-            async with tasks_lock:
-                tasks[tid]["error"] = str(e)
-                tasks[tid]["status"] = "error"
-    t = asyncio.create_task(worker())
-    async with tasks_lock:
-        tasks[tid]["task"] = t
-    return {"task_id": tid, "status": tasks[tid]["status"]}
+    tid = await submit(session_id, lambda: run(query, session_id))
+    return {"task_id": tid, "status": scheduler.get(tid)["status"]}
 
 @app.get("/api/tasks/{task_id}")
 async def get_task(task_id: str):
-    async with tasks_lock:
-        info = tasks.get(task_id)
+    info = scheduler.get(task_id)
     if not info:
         raise HTTPException(status_code=404, detail="Task not found")
     data = {"task_id": task_id, "status": info.get("status")}
@@ -83,17 +74,12 @@ async def get_task(task_id: str):
 
 @app.delete("/api/tasks/{task_id}")
 async def cancel_task(task_id: str):
-    async with tasks_lock:
-        info = tasks.get(task_id)
-    if not info:
+    status = scheduler.cancel(task_id)
+    if status is None:
         raise HTTPException(status_code=404, detail="Task not found")
-    t = info.get("task")
-    if t and not t.done():
-        t.cancel()
-        async with tasks_lock:
-            tasks[task_id]["status"] = "canceled"
-        return {"task_id": task_id, "status": "canceled"}
-    return {"task_id": task_id, "status": info.get("status")}
+    if status == "running":
+        status = "canceled"
+    return {"task_id": task_id, "status": status}
 
 @app.post("/api/search")
 async def search(request: Request, query: str | None = Form(None), session_id: int | None = Form(None)):
@@ -101,17 +87,73 @@ async def search(request: Request, query: str | None = Form(None), session_id: i
         data = await request.json()
         query = data.get("query")
         session_id = data.get("session_id")
-    res = await run(query, int(session_id))
+    session_id = int(session_id)
+    tid = await submit(session_id, lambda: run(query, session_id))
+    try:
+        await scheduler.wait(tid)
+    finally:
+        scheduler.cancel(tid)
+    info = scheduler.get(tid)
+    if info["status"] != "done":
+        raise HTTPException(status_code=500, detail=info["error"] or f"Task {info['status']}")
+    res = info["result"]
     return {
         "query": query,
         "history_id": res["history_id"],
         "answer": res["answer"],
     }
 
+@app.post("/api/search/stream")
+async def search_stream(request: Request):
+    """
+    Queue an agent run and push its progress as server-sent events, see `run_stream` for the event types.
+    Closing the connection cancels the run.
+    """
+    data = await request.json()
+    query = data["query"]
+    session_id = int(data["session_id"])
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def job():
+        async for event, payload in run_stream(query, session_id):
+            queue.put_nowait((event, payload))
+
+    tid = await submit(session_id, job)
+
+    def sse(event: str, payload: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    async def events():
+        yield sse("queued", {"task_id": tid})
+        finished = asyncio.ensure_future(scheduler.wait(tid))
+        try:
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({getter, finished}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    break
+                yield sse(*getter.result())
+            while not queue.empty():
+                yield sse(*queue.get_nowait())
+            info = scheduler.get(tid)
+            if info and info["status"] == "error":
+                yield sse("error", {"error": info["error"]})
+            elif info and info["status"] == "canceled":
+                yield sse("canceled", {"task_id": tid})
+        finally:
+            finished.cancel()
+            scheduler.cancel(tid)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
 
 @app.post("/api/sessions")
 async def create_session():
-    obj = Session.create()
+    obj = await store.write(Session.create)
     return {
         "id": obj.id,
         "created_at": obj.created_at,
@@ -119,8 +161,9 @@ async def create_session():
     }
 
 @app.get("/api/sessions")
-async def get_all_sessions():
-    sessions = Session.get_sessions()
+async def get_all_sessions(limit: int | None = Query(None, ge=1, le=200), before: int | None = None):
+    """Sessions from the newest, pass the id of the last one received as `before` to get the next page."""
+    sessions = await store.read(Session.get_sessions, limit, before)
     return [
         {
             "id": session.id,
@@ -132,8 +175,13 @@ async def get_all_sessions():
 
 
 @app.get("/api/sessions/{session_id}/histories")
-async def get_session_histories(session_id: int):
-    histories = History.get_histories(session_id)
+async def get_session_histories(session_id: int, limit: int | None = Query(None, ge=1, le=200),
+                                before: int | None = None):
+    """
+    Histories in chronological order. With `limit` only the newest ones, pass the id of the first one
+    received as `before` to get the previous page.
+    """
+    histories = await store.read(History.get_histories, session_id, limit, before)
     return [
         {
             "id": history.id,
@@ -147,22 +195,38 @@ async def get_session_histories(session_id: int):
 
 @app.delete("/api/sessions/{session_id}")
 async def delete_session(session_id: int):
-    success = Session.delete_session(session_id)
+    success = await store.write(Session.delete_session, session_id)
     if not success:
         raise HTTPException(status_code=404, detail="Session not found")
     return {"message": "Session deleted successfully"}
 
+@app.get("/api/histories/search")
+async def search_histories(q: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=100),
+                           offset: int = Query(0, ge=0)):
+    """
+    Full-text search over past inputs and answers, best matches first, with highlighted snippets.
+    Queries made only of 1-2 character terms cannot use the index: they scan the newest 5000 histories, newest first.
+    """
+    return await store.read(History.search, q, limit, offset)
+
 @app.delete("/api/histories/{history_id}")
 async def delete_history(history_id: int):
-    success = History.delete_history(history_id)
+    success = await store.write(History.delete_history, history_id)
     if not success:
         raise HTTPException(status_code=404, detail="History not found")
     return {"message": "History deleted successfully"}
 
 @app.on_event("startup")
 async def startup():
-    with db:
-        db.create_tables([Session, History])
+    store.start()
+    await store.write(db.create_tables, [Session, History])
+    await store.write(History.create_search_index)
+    scheduler.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await scheduler.stop()
+    await asyncio.to_thread(store.stop)
 
 def main():
     import uvicorn
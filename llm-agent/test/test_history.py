@@ -0,0 +1,46 @@
+import pytest
+
+from model import db
+from model.history import History
+from model.session import Session
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = db.database
+    db.init(str(tmp_path / "database.db"))
+    db.connect()
+    db.create_tables([Session, History])
+    History.create_search_index()
+    yield db
+    db.close()
+    db.init(path)
+
+
+def test_search_sync(database):
+    session = Session.create()
+    first = History.create(session.id, "东京天气怎么样", "东京明天多云")
+    second = History.create(session.id, "what is AI safety")
+    assert [h["id"] for h in History.search("天气")] == [first.id]
+    assert [h["id"] for h in History.search("东京 天气")] == [first.id]
+    assert [h["id"] for h in History.search("AI")] == [second.id]
+    # Unindexed terms only scan the newest histories
+    assert History.search("天气", scan_limit=1) == []
+    assert History.search("alignment") == []
+
+    History.update_answer(second.id, "AI safety studies alignment")
+    res = History.search("alignment")
+    assert [h["id"] for h in res] == [second.id]
+    assert "**alignment**" in res[0]["answer"]
+
+    History.delete_history(second.id)
+    assert History.search("alignment") == []
+    assert History.search("AI") == []
+
+
+def test_rebuild_existing(database):
+    session = Session.create()
+    history = History.create(session.id, "rust ownership rules")
+    database.execute_sql("DROP TABLE history_fts")
+    History.create_search_index()
+    assert [h["id"] for h in History.search("ownership")] == [history.id]
@@ -0,0 +1,87 @@
+import threading
+import time
+
+
+class CircuitBreaker(object):
+    """
+    Per-engine circuit breaker.
+    - closed: requests go through, consecutive failures are counted
+    - open: requests are rejected until `reset_timeout` has passed
+    - half-open: a single probe request goes through, closing the breaker on success
+      and opening it again with a doubled timeout on failure
+    A verification page opens the breaker after `forbidden_threshold` hits instead of `failure_threshold`.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, forbidden_threshold: int = 1, reset_timeout: float = 60,
+                 max_reset_timeout: float = 600):
+        self.failure_threshold = failure_threshold
+        self.forbidden_threshold = forbidden_threshold
+        self.base_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.forbidden = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def acquire(self) -> bool:
+        """
+        Whether a request may go through now. An allowed half-open probe must be followed by
+        `success`, `failure` or `release`.
+        """
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.forbidden = 0
+        self.reset_timeout = self.base_timeout
+        self._probing = False
+
+    def failure(self, forbidden: bool = False):
+        self.failures += 1
+        self.forbidden += 1 if forbidden else 0
+        if self.state == self.HALF_OPEN:
+            self.reset_timeout = min(self.reset_timeout * 2, self.max_reset_timeout)
+            self._open()
+        elif self.failures >= self.failure_threshold or self.forbidden >= self.forbidden_threshold:
+            self._open()
+
+    def release(self):
+        """
+        Give up a probe without an outcome, e.g. when the request was cancelled.
+        """
+        self._probing = False
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self._probing = False
+
+
+class CircuitBreakerRegistry(object):
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            if name not in self._breakers:
+                self._breakers[name] = CircuitBreaker(**self.kwargs)
+            return self._breakers[name]
+
+    def to_dict(self) -> dict[str, str]:
+        with self._lock:
+            return {name: breaker.state for name, breaker in self._breakers.items()}
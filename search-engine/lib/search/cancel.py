@@ -0,0 +1,40 @@
+import asyncio
+import os
+import tempfile
+import time
+
+from lib.search.sqlite import SharedSQLite
+
+
+class CancelRegistry(object):
+    """
+    Cancellation requests shared by all worker processes through one SQLite file.
+    A cancel RPC may land on another worker than the one running the request,
+    so the running worker polls the registry for its request id.
+    - ttl: seconds after which cancellation records are removed
+    """
+
+    def __init__(self, path: str = None, ttl: float = 3600):
+        self.path = path or os.path.join(tempfile.gettempdir(), "deepsearch-cancel.sqlite")
+        self.ttl = ttl
+        self._db = SharedSQLite(self.path, schema=(
+            "CREATE TABLE IF NOT EXISTS cancelled (id TEXT PRIMARY KEY, created REAL NOT NULL)",
+        ))
+
+    async def cancel(self, request_id: str):
+        now = time.time()
+        await self._db.aexecute("DELETE FROM cancelled WHERE created < ?", (now - self.ttl,))
+        await self._db.aexecute("INSERT OR REPLACE INTO cancelled VALUES (?, ?)", (request_id, now))
+
+    async def is_cancelled(self, request_id: str) -> bool:
+        return bool(await self._db.aexecute("SELECT 1 FROM cancelled WHERE id = ?", (request_id,)))
+
+    async def watch(self, request_id: str, task: asyncio.Future, interval: float = 0.5):
+        """
+        Cancel `task` once `request_id` is cancelled, until the task is done.
+        """
+        while not task.done():
+            if await self.is_cancelled(request_id):
+                task.cancel()
+                return
+            await asyncio.sleep(interval)
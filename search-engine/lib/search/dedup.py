@@ -0,0 +1,97 @@
+import hashlib
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import tldextract
+
+# Offline extractor using the public suffix list bundled with tldextract
+_extract = tldextract.TLDExtract(suffix_list_urls=())
+
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "gbraid", "wbraid", "yclid", "msclkid", "igshid", "mc_cid", "mc_eid",
+    "_hsenc", "_hsmi", "ref_src", "spm", "amp", "outputtype",
+}
+TRACKING_PREFIXES = ("utm_",)
+MOBILE_LABELS = {"m", "mobile", "amp", "wap", "touch"}
+
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af"
+_TOKEN = re.compile(f"[{_CJK}]|[^\\W{_CJK}]+")
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Map the variants of one page to a single key: scheme, `www`, mobile and AMP subdomains or paths,
+    tracking parameters, parameter order, trailing slashes and fragments are ignored.
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        # Malformed ports or IPv6 literals, left as they are
+        return url
+    scheme = parts.scheme.lower()
+    if scheme not in ("http", "https"):
+        return url
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"
+    else:
+        ext = _extract(host)
+        if ext.domain and ext.suffix:
+            labels = [label for label in ext.subdomain.split(".") if label and label not in MOBILE_LABELS]
+            if labels and labels[0] == "www":
+                labels = labels[1:]
+            host = ".".join(labels + [ext.domain, ext.suffix])
+    if port and port not in (80, 443):
+        host = f"{host}:{port}"
+    path = re.sub(r"/{2,}", "/", parts.path)
+    path = re.sub(r"(/amp)+/?$", "", path)
+    path = re.sub(r"\.amp(\.html?)$", r"\1", path)
+    path = path.rstrip("/") or "/"
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    ]
+    return urlunsplit(("https", host, path, urlencode(sorted(query)), ""))
+
+
+def simhash(text: str, shingle: int = 3, max_chars: int = 64 * 1024) -> int:
+    """
+    64-bit SimHash of the token shingles of the first `max_chars` of a text, CJK characters counting as single tokens.
+    """
+    tokens = _TOKEN.findall(text[:max_chars].lower())
+    if len(tokens) < shingle:
+        tokens = tokens + [""] * (shingle - len(tokens))
+    weights = [0] * 64
+    for i in range(len(tokens) - shingle + 1):
+        digest = hashlib.blake2b(" ".join(tokens[i:i + shingle]).encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "big")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+class SimHashIndex(object):
+    """
+    Fingerprints of the pages seen by one search, to detect near-duplicate content.
+    - distance: maximum number of differing bits for two pages to be considered duplicates
+    """
+
+    def __init__(self, distance: int = 3):
+        self.distance = distance
+        self._hashes: list[int] = []
+
+    def add(self, text: str) -> bool:
+        """
+        Add the text unless a near-duplicate was already added, return whether it was added.
+        """
+        return self.add_hash(simhash(text))
+
+    def add_hash(self, value: int) -> bool:
+        """
+        Same as `add` with the fingerprint already computed, e.g. off the event loop.
+        """
+        if any((value ^ seen).bit_count() <= self.distance for seen in self._hashes):
+            return False
+        self._hashes.append(value)
+        return True
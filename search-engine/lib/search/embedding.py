@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import os
+import threading
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+from lib.search.embedding_cache import EmbeddingCache
+
+DEFAULT_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+DEFAULT_CACHE_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "..", "assets", "embedding_cache"))
+
+
+class EmbeddingService(object):
+    """
+    Process-wide holder of the embedding model.
+    The model is loaded once, lazily on first use, and shared by every preset.
+    Chunk embeddings go through the on-disk cache unless `EMBED_CACHE_MAX_BYTES` is 0.
+    """
+
+    def __init__(self, model_name: str = None, batch_size: int = None, cache: EmbeddingCache = None):
+        self.model_name = model_name or os.environ.get("EMBED_MODEL_NAME", DEFAULT_MODEL_NAME)
+        self.batch_size = batch_size or int(os.environ.get("EMBED_BATCH_SIZE", "64"))
+        self.logger = logging.getLogger(__name__)
+        self._model: BaseEmbedding | None = None
+        self._lock = threading.Lock()
+        if cache is None:
+            max_bytes = int(os.environ.get("EMBED_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+            if max_bytes > 0:
+                cache = EmbeddingCache(os.environ.get("EMBED_CACHE_DIR", DEFAULT_CACHE_DIR), max_bytes)
+        self.cache = cache
+
+    @property
+    def model(self) -> BaseEmbedding:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self.logger.info(f"Loading embedding model {self.model_name}")
+                    self._model = HuggingFaceEmbedding(model_name=self.model_name,
+                                                       embed_batch_size=self.batch_size)
+        return self._model
+
+    def get_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed texts in one batch, reading and filling the cache. Blocking, run it off the event loop.
+        """
+        if self.cache is None:
+            return self.model.get_text_embedding_batch(texts)
+        keys = [EmbeddingCache.key(self.model_name, text) for text in texts]
+        cached = self.cache.get_many(keys)
+        missing = list({key: text for key, text in zip(keys, texts) if key not in cached}.items())
+        if missing:
+            vectors = self.model.get_text_embedding_batch([text for _, text in missing])
+            computed = {key: vector for (key, _), vector in zip(missing, vectors)}
+            self.cache.put_many(computed)
+            cached.update(computed)
+        return [cached[key] for key in keys]
+
+
+class BatchEmbedder(object):
+    """
+    Micro-batching embedder shared by all in-flight searches of one event loop.
+    - max_wait: seconds to wait for more chunks before a batch is flushed
+    - max_batch: number of chunks that flushes a batch immediately
+    Batches run one at a time in a worker thread. Chunks arriving meanwhile are held back,
+    and all of them form the next batch as soon as the running one finishes.
+    """
+
+    def __init__(self, service: EmbeddingService, max_wait: float = 0.005, max_batch: int = 256):
+        self.service = service
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self._pending: list[tuple[list[str], asyncio.Future]] = []
+        self._pending_size = 0
+        self._timer: asyncio.TimerHandle | None = None
+        self._running = False
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((texts, future))
+        self._pending_size += len(texts)
+        # While a batch runs, the pending chunks wait for it to finish
+        if not self._running:
+            if self._pending_size >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    async def embed_query(self, query: str) -> list[float]:
+        return await asyncio.to_thread(self.service.model.get_query_embedding, query)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._running or not self._pending:
+            return
+        batch, self._pending, self._pending_size = self._pending, [], 0
+        self._running = True
+        asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch: list[tuple[list[str], asyncio.Future]]):
+        texts = [text for texts, _ in batch for text in texts]
+        try:
+            vectors = await asyncio.to_thread(self.service.get_text_embeddings, texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._running = False
+            self._flush()
+        offset = 0
+        for texts, future in batch:
+            if not future.done():
+                future.set_result(vectors[offset:offset + len(texts)])
+            offset += len(texts)
+
+
+_service: EmbeddingService | None = None
+_service_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = EmbeddingService()
+    return _service
@@ -0,0 +1,160 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+
+class EmbeddingCache(object):
+    """
+    On-disk embedding cache keyed by hash of (model name, chunk text), shared by all worker processes.
+    - vectors are stored in a memory-mapped float32 file with one fixed slot per entry
+    - a small SQLite index maps keys to slots and tracks last access for LRU eviction
+    - a parallel memory-mapped tag array guards readers against slots being recycled concurrently
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(path, "index.sqlite"), timeout=30,
+                                   check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries ("
+                         "key BLOB PRIMARY KEY, slot INTEGER UNIQUE NOT NULL, last_access REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._db.execute("INSERT OR IGNORE INTO meta VALUES ('hits', 0), ('misses', 0)")
+        self._vectors: np.memmap | None = None
+        self._tags: np.memmap | None = None
+        self.dim = self._meta("dim")
+        self.capacity = self._meta("capacity")
+        if self.dim:
+            self._init(self.dim)
+
+    @staticmethod
+    def key(model_name: str, text: str) -> bytes:
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).digest()[:16]
+
+    @staticmethod
+    def _tag(key: bytes) -> int:
+        return int.from_bytes(key[:8], "little", signed=True) or 1
+
+    def _meta(self, name: str) -> int | None:
+        row = self._db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _files(self) -> list[tuple[str, int]]:
+        return [(os.path.join(self.path, "vectors.f32"), self.capacity * self.dim * 4),
+                (os.path.join(self.path, "tags.i64"), self.capacity * 8)]
+
+    def _open(self):
+        # The files are only created in `_init`, never truncated by opening them
+        (vectors_path, _), (tags_path, _) = self._files()
+        self._vectors = np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+        self._tags = np.memmap(tags_path, dtype=np.int64, mode="r+", shape=(self.capacity,))
+
+    def _init(self, dim: int):
+        capacity = max(1, self.max_bytes // (dim * 4 + 8))
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self.dim = self._meta("dim")
+            self.capacity = self._meta("capacity")
+            if not self.dim:
+                self.dim, self.capacity = dim, capacity
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?), ('capacity', ?)", (dim, capacity))
+            # Created and sized while holding the write lock, so that no other process sees them half made;
+            # appending then truncating never drops vectors already stored
+            for file_path, size in self._files():
+                with open(file_path, "ab") as f:
+                    if f.tell() != size:
+                        f.truncate(size)
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._open()
+
+    def get_many(self, keys: list[bytes]) -> dict[bytes, np.ndarray]:
+        found = {}
+        if not keys:
+            return found
+        with self._lock:
+            # Another process may have stored the first vectors since this instance was opened
+            if self._vectors is None and self._meta("dim"):
+                self._init(self._meta("dim"))
+            if self._vectors is not None:
+                slots = {}
+                for i in range(0, len(keys), 500):
+                    batch = keys[i:i + 500]
+                    rows = self._db.execute(
+                        f"SELECT key, slot FROM entries WHERE key IN ({','.join('?' * len(batch))})", batch
+                    ).fetchall()
+                    slots.update(rows)
+                for key, slot in slots.items():
+                    vector = np.array(self._vectors[slot])
+                    # The slot may have been recycled by another process since the lookup
+                    if self._tags[slot] == self._tag(key):
+                        found[key] = vector
+                if found:
+                    self._db.executemany("UPDATE entries SET last_access = julianday('now') WHERE key = ?",
+                                         [(key,) for key in found])
+            self._db.execute("UPDATE meta SET value = value + ? WHERE name = 'hits'", (len(found),))
+            self._db.execute("UPDATE meta SET value = value + ? WHERE name = 'misses'", (len(keys) - len(found),))
+        return found
+
+    def put_many(self, items: dict[bytes, list[float]]) -> None:
+        if not items:
+            return
+        with self._lock:
+            if self._vectors is None:
+                self._init(len(next(iter(items.values()))))
+            items = list(items.items())[:self.capacity]
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                keys = [key for key, _ in items]
+                existing = {
+                    row[0] for row in self._db.execute(
+                        f"SELECT key FROM entries WHERE key IN ({','.join('?' * len(keys))})", keys
+                    )
+                }
+                items = [(key, vector) for key, vector in items if key not in existing]
+                count = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                slots = list(range(count, min(self.capacity, count + len(items))))
+                if len(slots) < len(items):
+                    evicted = self._db.execute(
+                        "SELECT key, slot FROM entries ORDER BY last_access LIMIT ?", (len(items) - len(slots),)
+                    ).fetchall()
+                    self._db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in evicted])
+                    slots.extend(slot for _, slot in evicted)
+                for (key, vector), slot in zip(items, slots):
+                    self._tags[slot] = 0
+                    self._vectors[slot] = vector
+                    self._tags[slot] = self._tag(key)
+                self._db.executemany("INSERT INTO entries VALUES (?, ?, julianday('now'))",
+                                     [(key, slot) for (key, _), slot in zip(items, slots)])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            hits, misses = self._meta("hits") or 0, self._meta("misses") or 0
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        files = ["vectors.f32", "tags.i64", "index.sqlite", "index.sqlite-wal"]
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "entries": entries,
+            "capacity": self.capacity or 0,
+            "used_bytes": entries * ((self.dim or 0) * 4 + 8),
+            "disk_bytes": sum(os.path.getsize(os.path.join(self.path, f))
+                              for f in files if os.path.exists(os.path.join(self.path, f))),
+        }
@@ -1,9 +1,14 @@
+import asyncio
 import inspect
 import logging
+import math
 from dataclasses import dataclass
+from functools import cached_property
 from typing import Optional, Iterator, Callable
 from urllib.parse import urlencode
 
+from lxml import etree
+from lxml.cssselect import CSSSelector
 from lxml.html import HtmlElement, fromstring
 
 from lib.search.request import Response, RequestClient
@@ -30,15 +35,43 @@ class Selector(object):
     postprocess: Optional[Callable[[str], str]] = None
 
 
+@dataclass
+class CompiledSchema(object):
+    """
+    CSS selectors of a schema translated once into lxml XPath objects.
+    - container: compiled container selector
+    - groups: compiled selector and the (name, selector) fields sharing it, None selects the container itself
+    """
+    container: CSSSelector
+    groups: list[tuple[Optional[CSSSelector], list[tuple[str, Selector]]]]
+
+    @classmethod
+    def compile(cls, schema: "Schema.__class__") -> "CompiledSchema":
+        groups: dict[Optional[str], list[tuple[str, Selector]]] = {}
+        for name, value in inspect.getmembers(schema):
+            if isinstance(value, Selector):
+                groups.setdefault(value.selector or None, []).append((name, value))
+        return cls(
+            container=CSSSelector(schema.container, translator="html"),
+            groups=[(CSSSelector(css, translator="html") if css else None, fields) for css, fields in groups.items()],
+        )
+
+
 class Schema(object):
     """
     - container: css selector to select the container of the search result
     - preprocess: function to preprocess the element before extraction
+    Selectors are compiled once when the class is defined, see `CompiledSchema`.
     """
     container: str = "html"
     url: Optional[Selector] = None
     abstract: Optional[Selector] = None
     preprocess: Optional[Callable[[HtmlElement], HtmlElement]] = None
+    compiled: CompiledSchema = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.compiled = CompiledSchema.compile(cls)
 
     def __init__(self, **kwargs):
         for key, value in kwargs.items():
@@ -51,61 +84,90 @@ class Schema(object):
         return self.__str__()
 
 
+Schema.compiled = CompiledSchema.compile(Schema)
+
+
 @dataclass
 class Result(object):
     title: str
     content: list[Schema]
 
 
+_TITLE = CSSSelector("title", translator="html")
+
+
+def _extract(selector: Selector, element: HtmlElement) -> Optional[str]:
+    value = None
+    if selector.text_content:
+        value = clean_text(element.text_content())
+    elif selector.text:
+        value = clean_text(element.text)
+    elif selector.tail:
+        value = clean_text(element.tail)
+    elif selector.attribute:
+        value = element.get(selector.attribute)
+    if callable(selector.postprocess) and value is not None:
+        value = selector.postprocess(value)
+    return value
+
+
+def _head_title(html: str, chunk_size: int = 16 * 1024, limit: int = 512 * 1024) -> Optional[str]:
+    """
+    Read the title with an incremental parser, stopping at the end of <head> instead of parsing the whole page.
+    None when no title was found before the end of <head> or within `limit` characters.
+    """
+    html = html.lstrip("\ufeff")
+    parser = etree.HTMLPullParser(events=("end",))
+    for offset in range(0, min(len(html), limit), chunk_size):
+        parser.feed(html[offset:offset + chunk_size])
+        for event, element in parser.read_events():
+            if element.tag == "title":
+                return "".join(element.itertext())
+            if element.tag == "head":
+                return None
+    return None
+
+
 class Parser(object):
+    """
+    The lxml tree is only built when the schema has selectors or it is accessed,
+    pages without selectors only need their title and markdown.
+    """
+
     def __init__(self, html: str, markdown: str, schema: Schema.__class__ = Schema):
         self.html = html
         self.markdown = markdown
         self.schema = schema
-        self.selectors = {
-            name: value for name, value in inspect.getmembers(self.schema)
-            if isinstance(value, Selector)
-        }
-        self.tree = fromstring(html)
+        self.compiled = schema.compiled
+
+    @cached_property
+    def tree(self) -> HtmlElement:
+        return fromstring(self.html)
 
     def title(self) -> str:
-        titles = self.tree.cssselect("title")
+        if "tree" not in self.__dict__ and not self.compiled.groups:
+            # Unusual pages (e.g. content before <title>, huge heads) fall back to the full tree
+            title = _head_title(self.html)
+            if title is not None:
+                return title
+        titles = _TITLE(self.tree)
         return titles[0].text_content() if titles else ""
 
     def parse(self) -> list[Schema]:
-        if not self.selectors:
+        if not self.compiled.groups:
             return [self.schema(content=self.markdown)]
         results = []
-        elements = self.tree.cssselect(self.schema.container)
-        for element in elements:
+        for element in self.compiled.container(self.tree):
             if self.schema.preprocess:
                 element = self.schema.preprocess(element)
                 if not element:
                     continue
             model = self.schema()
-            for key, selector in self.selectors.items():
-                if not isinstance(selector, Selector):
-                    continue
-                outer = (
-                    element.cssselect(selector.selector)
-                    if selector.selector
-                    else [element]
-                )
-                if not outer:
-                    setattr(model, key, None)
-                    continue
-                value = None
-                if selector.text_content:
-                    value = clean_text(outer[0].text_content())
-                elif selector.text:
-                    value = clean_text(outer[0].text)
-                elif selector.tail:
-                    value = clean_text(outer[0].tail)
-                elif selector.attribute:
-                    value = outer[0].get(selector.attribute)
-                if callable(selector.postprocess) and value is not None:
-                    value = selector.postprocess(value)
-                setattr(model, key, value)
+            # Every distinct selector is evaluated once per container, whatever the number of fields using it
+            for xpath, fields in self.compiled.groups:
+                outer = xpath(element) if xpath is not None else [element]
+                for key, selector in fields:
+                    setattr(model, key, _extract(selector, outer[0]) if outer else None)
             results.append(model)
         return results
 
@@ -117,6 +179,13 @@ class Engine(object):
     NAME = "base"
     BASE_URL = None
     DESCRIPTION = None
+    # Whether pages of this engine may be fetched without the browser first
+    FAST_FETCH = True
+    # Typical number of results per page, used to predict how many pages to fetch
+    PAGE_SIZE = 10
+    # Seconds fetched pages are kept in the shared fetch cache
+    SERP_CACHE_TTL = 10 * 60
+    PAGE_CACHE_TTL = 24 * 60 * 60
 
     @classmethod
     def _query(cls, target: str) -> dict:
@@ -145,7 +214,13 @@ class Engine(object):
         self.parser = parser
         self.logger = logging.getLogger('BaseSearchEngine')
 
-    async def search(self, target: str, num: int = -1, latest: bool = False, **kwargs) -> Result:
+    async def search(self, target: str, num: int = -1, latest: bool = False, concurrent: bool = True,
+                     **kwargs) -> Result:
+        """
+        - num: number of results to collect over several pages, first page only when <= 0
+        - latest: restrict results to recent ones and bypass cached pages
+        - concurrent: fetch the pages predicted to be needed at once instead of one after another
+        """
         params = kwargs.get('params', {})
         if latest:
             params.update(self.__class__._latest() or {})
@@ -153,14 +228,26 @@ class Engine(object):
         kwargs['params'] = params
 
         url = self.__class__.BASE_URL if self.__class__.BASE_URL else target
+        kwargs['ttl'] = self.__class__.SERP_CACHE_TTL if self.__class__.BASE_URL else self.__class__.PAGE_CACHE_TTL
+        kwargs['fresh'] = latest
+        # Verification pages must not be served from the cache once the engine recovers
+        kwargs['valid'] = lambda resp: not self.__class__._detect_sorry(resp)
 
         # Request
-        async def _search():
-            _resp = await self.client.get(url, **kwargs)
+        async def _search(page: dict | None = None):
+            _kwargs = {**kwargs, 'params': {**params, **(page or {})}}
+            _resp = await self.client.get(url, browser=not self.__class__.FAST_FETCH, **_kwargs)
             _resp.raise_for_status()
-            self.logger.info(f"Successfully get response from {url}?{urlencode(kwargs.get('params', {}))}")
+            self.logger.info(f"Successfully get response from {url}?{urlencode(_kwargs['params'])}")
             parser = self.parser(html=_resp.html, markdown=_resp.markdown)
             res = Result(title=parser.title(), content=parser.parse())
+            # A statically fetched page that is blocked or yields no results is rendered by the browser instead
+            if _resp.source == "http" and (self.__class__._detect_sorry(_resp)
+                                           or (self.__class__.BASE_URL and not res.content)):
+                _resp = await self.client.get(url, browser=True, **_kwargs)
+                _resp.raise_for_status()
+                parser = self.parser(html=_resp.html, markdown=_resp.markdown)
+                res = Result(title=parser.title(), content=parser.parse())
             if self.__class__._detect_sorry(_resp):
                 self.logger.error(f"Sorry, some verification is required for {_resp.url}")
                 raise ProxyForbiddenException(f"Sorry, some verification is required for {_resp.url}")
@@ -170,18 +257,42 @@ class Engine(object):
         if num <= 0:
             return await _search()
 
-        resp = await _search()
-        content = resp.content
-        count = len(content)
         pager = self.__class__._pager()
         next(pager, None)
-        while count < num and (page := next(pager, None)):
-            params.update(page)
-            kwargs['params'] = params
-            resp = await _search()
+        pages = [None]
+        if concurrent:
+            # Predict the number of pages from the typical page size and fetch them at once
+            while len(pages) < math.ceil(num / self.__class__.PAGE_SIZE) and (page := next(pager, None)):
+                pages.append(page)
+        tasks = [asyncio.ensure_future(_search(page)) for page in pages]
+        # A short page means the following ones are empty, only an empty one when fetching sequentially
+        short = self.__class__.PAGE_SIZE // 2 if len(tasks) > 1 else 1
+        content = []
+        try:
+            resp = await tasks[0]
+            content.extend(resp.content)
+            exhausted = len(resp.content) < short
+            for task in tasks[1:]:
+                if exhausted:
+                    break
+                try:
+                    page_resp = await task
+                except ProxyForbiddenException:
+                    raise
+                except Exception as e:
+                    self.logger.error(f"Failed to get a result page from {url}: {e}")
+                    exhausted = True
+                    break
+                content.extend(page_resp.content)
+                exhausted = len(page_resp.content) < short
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        while not exhausted and len(content) < num and (page := next(pager, None)):
+            resp = await _search(page)
             if not resp.content:
                 break
-            count += len(resp.content)
             content.extend(resp.content)
 
         return Result(title=resp.title, content=content[:num])
@@ -27,6 +27,7 @@ class GoogleEngine(Engine):
     NAME = "google"
     BASE_URL = "https://www.google.com/search"
     DESCRIPTION = "Popular search engine with high-quality results and reliable sources."
+    FAST_FETCH = False
 
     @classmethod
     def _query(cls, target: str) -> dict:
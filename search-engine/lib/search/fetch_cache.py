@@ -0,0 +1,68 @@
+import asyncio
+import hashlib
+import time
+import zlib
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from lib.search.sqlite import SharedSQLite
+
+
+def cache_key(url: str, params: dict = None) -> str:
+    """
+    Normalize the URL and its parameters into a stable key: lowercase scheme and host, no fragment,
+    query parameters merged and sorted.
+    """
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    query.extend((str(k), str(v)) for k, v in (params or {}).items())
+    normalized = urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/",
+                             urlencode(sorted(query)), ""))
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class FetchCache(object):
+    """
+    Fetched pages shared by all worker processes through one SQLite file, each entry expiring after its own TTL.
+    Entries are the keyword arguments of a `Response`, with html and markdown stored compressed.
+    """
+
+    def __init__(self, path: str, purge_every: int = 200):
+        self.path = path
+        self.purge_every = purge_every
+        self._puts = 0
+        self._db = SharedSQLite(path, schema=(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "key TEXT PRIMARY KEY, url TEXT NOT NULL, status_code INTEGER NOT NULL, "
+            "html BLOB, markdown BLOB, source TEXT NOT NULL, expires REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS pages_expires ON pages (expires)",
+        ))
+
+    def _get(self, key: str) -> Optional[dict]:
+        rows = self._db.execute(
+            "SELECT url, status_code, html, markdown, source FROM pages WHERE key = ? AND expires > ?",
+            (key, time.time()),
+        )
+        if not rows:
+            return None
+        url, status_code, html, markdown, source = rows[0]
+        return dict(url=url, status_code=status_code,
+                    html=zlib.decompress(html).decode("utf-8") if html is not None else "",
+                    markdown=zlib.decompress(markdown).decode("utf-8") if markdown is not None else None,
+                    source=source)
+
+    def _put(self, key: str, page: dict, ttl: float):
+        html = zlib.compress(page["html"].encode("utf-8")) if page.get("html") is not None else None
+        markdown = zlib.compress(page["markdown"].encode("utf-8")) if page.get("markdown") is not None else None
+        now = time.time()
+        self._db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (key, page["url"], page["status_code"], html, markdown, page["source"], now + ttl))
+        self._puts += 1
+        if self._puts % self.purge_every == 0:
+            self._db.execute("DELETE FROM pages WHERE expires <= ?", (now,))
+
+    async def get(self, key: str) -> Optional[dict]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def put(self, key: str, page: dict, ttl: float):
+        await asyncio.to_thread(self._put, key, page, ttl)
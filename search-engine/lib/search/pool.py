@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator
+from urllib.parse import urlsplit
+
+from crawl4ai import AsyncWebCrawler
+
+
+@dataclass
+class _Slot(object):
+    session_id: str
+    uses: int = 0
+
+
+class BrowserPool(object):
+    """
+    Bounded pool of reusable crawler sessions, each one a browser context and page kept by crawl4ai.
+    - size: maximum number of pages rendered at once
+    - per_host: maximum number of pages rendered at once for the same host
+    - max_uses: number of renders after which a session is closed and replaced, to cap memory growth
+    """
+
+    def __init__(self, crawler: AsyncWebCrawler, size: int = 8, per_host: int = 2, max_uses: int = 50):
+        self.crawler = crawler
+        self.size = size
+        self.per_host = per_host
+        self.max_uses = max_uses
+        self.logger = logging.getLogger(__name__)
+        self._free = [_Slot(session_id=uuid.uuid4().hex) for _ in range(size)]
+        self._global = asyncio.Semaphore(size)
+        self._hosts: dict[str, tuple[asyncio.Semaphore, int]] = {}
+        # Metrics
+        self.waiting = 0
+        self.acquired = 0
+        self.recycled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @asynccontextmanager
+    async def session(self, url: str) -> AsyncIterator[str]:
+        """
+        Wait for a free session allowed for the host of `url` and yield its id.
+        """
+        host = urlsplit(url).hostname or ""
+        semaphore, users = self._hosts.get(host) or (asyncio.Semaphore(self.per_host), 0)
+        self._hosts[host] = (semaphore, users + 1)
+        start = time.monotonic()
+        waiting = True
+        self.waiting += 1
+        try:
+            async with semaphore, self._global:
+                self.waiting -= 1
+                waiting = False
+                waited = time.monotonic() - start
+                self.acquired += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+                slot = self._free.pop()
+                broken = False
+                try:
+                    yield slot.session_id
+                except BaseException:
+                    # The page may be left mid-navigation, do not hand it to the next render
+                    broken = True
+                    raise
+                finally:
+                    slot.uses += 1
+                    if broken or slot.uses >= self.max_uses:
+                        await self._recycle(slot)
+                    self._free.append(slot)
+        finally:
+            if waiting:
+                self.waiting -= 1
+            semaphore, users = self._hosts[host]
+            if users <= 1:
+                del self._hosts[host]
+            else:
+                self._hosts[host] = (semaphore, users - 1)
+
+    async def _recycle(self, slot: _Slot):
+        try:
+            await self.crawler.crawler_strategy.kill_session(slot.session_id)
+        except Exception as e:
+            self.logger.warning(f"Failed to close browser session {slot.session_id}: {e}")
+        slot.session_id = uuid.uuid4().hex
+        slot.uses = 0
+        self.recycled += 1
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "size": self.size,
+            "in_use": self.size - len(self._free),
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "recycled": self.recycled,
+            "avg_wait": self.total_wait / self.acquired if self.acquired else 0.0,
+            "max_wait": self.max_wait,
+        }
@@ -1,7 +1,9 @@
 from abc import ABC, abstractmethod
 from enum import Enum
+from typing import AsyncIterator
 
 from lib import Searcher
+from lib.search.engines.base import Result
 from lib.search.request import RequestClient
 
 
@@ -21,3 +23,10 @@ class Preset(ABC):
     @abstractmethod
     async def search(self, query: str, preference: Preference, client: RequestClient):
         pass
+
+    async def search_stream(self, query: str, preference: Preference, client: RequestClient) -> AsyncIterator[Result]:
+        """
+        Yield partial results as they become available, the last one being complete.
+        Presets without a streaming implementation yield their full result once.
+        """
+        yield await self.search(query, preference, client)
@@ -1,4 +1,6 @@
-from lib.search.engines import DuckDuckGoEngine, BingEngine, So360Engine, SougouEngine
+from typing import AsyncIterator
+
+from lib.search.engines import DuckDuckGoEngine, BingEngine, So360Engine, SougouEngine, BraveEngine
 from lib.search.engines.base import Result
 from lib.search.presets.base import Preset, Preference
 from lib.search.request import RequestClient
@@ -8,18 +10,28 @@ from lib.search.searcher import EngineConfig
 class DefaultPreset(Preset):
     DESCRIPTION = "Suitable for most of the cases."
 
-    async def search(self, query: str, preference: Preference, client: RequestClient) -> Result:
+    @staticmethod
+    def _options(preference: Preference, client: RequestClient) -> dict:
         num = 20
         latest = False
         if preference == Preference.MORE_RESULTS:
             num = 30
         if preference == Preference.LATEST:
             latest = True
-        return await self.searcher.aggregate_search(query=query,
-                                                    client=client,
-                                                    engines=[EngineConfig(DuckDuckGoEngine(client=client), 1),
-                                                             EngineConfig(BingEngine(client=client), 1),
-                                                             EngineConfig(So360Engine(client=client), 1),
-                                                             EngineConfig(SougouEngine(client=client), 1)],
-                                                    num=num,
-                                                    latest=latest)
+        return dict(engines=[EngineConfig(DuckDuckGoEngine(client=client), 1, backup=BraveEngine(client=client)),
+                             EngineConfig(BingEngine(client=client), 1),
+                             EngineConfig(So360Engine(client=client), 1),
+                             EngineConfig(SougouEngine(client=client), 1)],
+                    num=num,
+                    deadline=20,
+                    serp_deadline=15,
+                    min_previews=num,
+                    latest=latest)
+
+    async def search(self, query: str, preference: Preference, client: RequestClient) -> Result:
+        return await self.searcher.aggregate_search(query=query, client=client, **self._options(preference, client))
+
+    async def search_stream(self, query: str, preference: Preference, client: RequestClient) -> AsyncIterator[Result]:
+        async for res in self.searcher.aggregate_search_stream(query=query, client=client,
+                                                               **self._options(preference, client)):
+            yield res
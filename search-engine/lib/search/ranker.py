@@ -0,0 +1,39 @@
+import numpy as np
+
+
+class VectorRanker(object):
+    """
+    Rank chunks by cosine similarity to a query.
+    Chunk embeddings are held in one contiguous, row-normalized float32 matrix.
+    """
+
+    def __init__(self, embeddings: list[list[float]] | np.ndarray):
+        matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2:
+            matrix = matrix.reshape(len(matrix), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        self.matrix = matrix / norms
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def scores(self, query: list[float] | np.ndarray) -> np.ndarray:
+        query = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        return self.matrix @ (query / norm if norm else query)
+
+    def top_k(self, query: list[float] | np.ndarray, k: int) -> list[tuple[int, float]]:
+        """
+        Return (index, score) pairs of the k most similar chunks, best first.
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            return []
+        scores = self.scores(query)
+        if k < len(scores):
+            indices = np.argpartition(-scores, k - 1)[:k]
+        else:
+            indices = np.arange(len(scores))
+        indices = indices[np.argsort(-scores[indices], kind="stable")]
+        return [(int(i), float(scores[i])) for i in indices]
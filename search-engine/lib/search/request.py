@@ -1,8 +1,36 @@
+import asyncio
 import logging
-from dataclasses import dataclass
-from typing import Optional
+import os
+import re
+from dataclasses import dataclass, asdict
+from typing import Callable, Optional
 from urllib.parse import urlencode
+
+import httpx
 from crawl4ai import AsyncWebCrawler, CrawlerRunConfig, CacheMode
+from crawl4ai.markdown_generation_strategy import DefaultMarkdownGenerator
+
+from lib.search.fetch_cache import FetchCache, cache_key
+from lib.search.pool import BrowserPool
+from lib.search.singleflight import SingleFlight
+
+DEFAULT_FETCH_CACHE_PATH = os.path.normpath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "assets", "fetch_cache.sqlite"))
+
+_USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+               "Chrome/131.0.0.0 Safari/537.36")
+_INVISIBLE = re.compile(r"<(script|style|noscript|template|svg)\b.*?</\1\s*>|<!--.*?-->", re.S | re.I)
+_TAG = re.compile(r"<[^>]+>")
+_JS_REQUIRED = re.compile(r"enable javascript|javascript is (?:required|disabled)|requires javascript", re.I)
+
+
+def _needs_browser(html: str, min_text: int = 200) -> bool:
+    """
+    Guess whether a statically fetched page needs a browser to render its content.
+    """
+    visible = _TAG.sub(" ", _INVISIBLE.sub(" ", html))
+    text = " ".join(visible.split())
+    return len(text) < min_text or (len(text) < 2000 and bool(_JS_REQUIRED.search(text)))
 
 
 @dataclass
@@ -11,6 +39,8 @@ class Response:
     status_code: int
     html: str
     markdown: Optional[str] = None
+    # "http" when served by the plain HTTP client, "browser" when rendered by the crawler
+    source: str = "browser"
 
     def raise_for_status(self):
         status_code = int(self.status_code)
@@ -19,18 +49,103 @@ class Response:
 
 
 class RequestClient:
+    """
+    Tiered fetcher: pages are first fetched with a pooled HTTP/1.1 + HTTP/2 client and converted to markdown,
+    and only rendered by the headless browser when they look like they need JavaScript or `browser=True`.
+    Responses requested with a `ttl` go through a fetch cache shared by all worker processes.
+    """
 
-    def __init__(self):
+    def __init__(self, fast: bool = True, timeout: float = 10.0, pool_size: int = 8, per_host: int = 2,
+                 max_uses: int = 50, cache: FetchCache = None):
         super().__init__()
         self.logger = logging.getLogger(__name__)
+        self.cache = cache or FetchCache(os.environ.get("FETCH_CACHE_PATH", DEFAULT_FETCH_CACHE_PATH))
+        self.flight = SingleFlight()
         self.crawler = AsyncWebCrawler()
+        self.pool = BrowserPool(self.crawler, size=pool_size, per_host=per_host, max_uses=max_uses)
+        self.fast = fast
+        self.http = httpx.AsyncClient(
+            http2=True,
+            follow_redirects=True,
+            timeout=timeout,
+            headers={"User-Agent": _USER_AGENT, "Accept-Language": "en-US,en;q=0.9,zh-CN;q=0.8"},
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+        self.markdown_generator = DefaultMarkdownGenerator()
+
+    async def get(self, url: str, browser: bool = False, ttl: float = None, fresh: bool = False,
+                  valid: Callable[[Response], bool] = None, **kwargs):
+        """
+        - browser: skip the plain HTTP client and render the page in the browser
+        - ttl: seconds to keep the response in the shared fetch cache, None to not cache it
+        - fresh: ignore cached responses, the new one still refreshes the cache
+        - valid: responses failing this check (e.g. verification pages) are not cached
+        Concurrent identical requests of this process share one in-flight fetch, e.g. those of streaming searches
+        running alongside an RPC. Requests in other worker processes go through the shared fetch cache only.
+        """
+        key = (cache_key(url, kwargs.get("params")), browser, ttl, fresh)
+        return await self.flight.do(key, lambda: self._cached_get(url, browser, ttl, fresh, valid, **kwargs))
 
-    async def get(self, url: str, **kwargs):
+    async def _cached_get(self, url: str, browser: bool, ttl: float | None, fresh: bool,
+                          valid: Callable[[Response], bool] | None, **kwargs) -> Response:
+        if not ttl:
+            return await self._get(url, browser, **kwargs)
+        key = cache_key(url, kwargs.get("params"))
+        if not fresh:
+            page = await self.cache.get(key)
+            # A page cached from the plain HTTP client does not satisfy an explicit browser request
+            if page is not None and (not browser or page["source"] == "browser"):
+                return Response(**page)
+        wrapped = await self._get(url, browser, **kwargs)
+        if int(wrapped.status_code) < 400 and (valid is None or valid(wrapped)):
+            await self.cache.put(key, asdict(wrapped), ttl)
+        return wrapped
+
+    async def _get(self, url: str, browser: bool = False, **kwargs) -> Response:
+        if self.fast and not browser:
+            try:
+                wrapped = await self._fetch(url, **kwargs)
+                if wrapped is not None:
+                    return wrapped
+            except httpx.HTTPError as e:
+                self.logger.info(f"Fast fetch failed for {url}, falling back to browser: {e}")
+        return await self._render(url, **kwargs)
+
+    async def _fetch(self, url: str, **kwargs) -> Optional[Response]:
+        """
+        Fetch the page without a browser, return None when the result is not usable as is.
+        """
+        resp = await self.http.get(url, params=kwargs.get("params") or None)
+        content_type = resp.headers.get("content-type", "")
+        if resp.status_code >= 400 or "html" not in content_type:
+            return None
+        html = resp.text
+        if _needs_browser(html):
+            return None
+        markdown = await asyncio.to_thread(self._markdown, html, str(resp.url))
+        return Response(url=str(resp.url), status_code=resp.status_code, html=html, markdown=markdown, source="http")
+
+    def _markdown(self, html: str, base_url: str) -> str:
+        result = self.markdown_generator.generate_markdown(
+            input_html=html,
+            base_url=base_url,
+            html2text_options={"ignore_images": True},
+            citations=False,
+        )
+        return result.raw_markdown
+
+    async def _render(self, url: str, **kwargs) -> Response:
         if not self.crawler.ready:
             await self.crawler.start()
+        async with self.pool.session(url) as session_id:
+            return await self._crawl(url, session_id, **kwargs)
+
+    async def _crawl(self, url: str, session_id: str, **kwargs) -> Response:
         scripts = []
         config = CrawlerRunConfig(
-            cache_mode=CacheMode.ENABLED,
+            session_id=session_id,
+            # Freshness is handled by the shared fetch cache
+            cache_mode=CacheMode.BYPASS,
             js_code=scripts,
             exclude_all_images=True,
             exclude_external_links=True,
@@ -55,4 +170,5 @@ class RequestClient:
         return wrapped
 
     async def aclose(self):
+        await self.http.aclose()
         await self.crawler.close()
@@ -1,33 +1,54 @@
 import asyncio
 import logging
 import math
-from tenacity import retry, stop_after_attempt, wait_exponential
+import time
+from typing import AsyncIterator
+
+from tenacity import (retry, retry_if_exception_type, retry_if_not_exception_type, stop_after_attempt,
+                      wait_exponential)
 
 from lib.search.engines.base import Engine, Result, Schema
 from dataclasses import dataclass
 
+from lib.search.breaker import CircuitBreakerRegistry
+from lib.search.dedup import SimHashIndex, canonicalize_url, simhash
+from lib.search.embedding import BatchEmbedder, EmbeddingService, get_embedding_service
+from lib.search.exception import ProxyForbiddenException
+from lib.search.ranker import VectorRanker
 from lib.search.request import RequestClient
-from llama_index.core import Document, VectorStoreIndex
+from lib.search.stats import EngineStatsRegistry
 from llama_index.core.node_parser import SentenceSplitter
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 
 
 @dataclass
 class EngineConfig(object):
+    """
+    - backup: engine queried as well when `engine` is slower than usual or its circuit is open
+    """
     engine: Engine
     weight: int = 1
-
-
-def _build_index(documents):
-    embed_model = HuggingFaceEmbedding(model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
-    return VectorStoreIndex.from_documents(documents, embed_model=embed_model)
+    backup: Engine | None = None
 
 
 class Searcher(object):
-    def __init__(self):
+    """
+    - hedge_quantile: latency percentile of the primary engine after which its backup is queried
+    - hedge_delay: delay before querying the backup while the primary has no latency history
+    """
+
+    def __init__(self, embedding: EmbeddingService = None, hedge_quantile: float = 0.9, hedge_delay: float = 5.0):
         self.logger = logging.getLogger(__name__)
+        self.embedding = embedding or get_embedding_service()
+        self.embedder = BatchEmbedder(self.embedding)
+        self.splitter = SentenceSplitter(chunk_size=512, chunk_overlap=128)
+        self.stats = EngineStatsRegistry()
+        self.breakers = CircuitBreakerRegistry()
+        self.hedge_quantile = hedge_quantile
+        self.hedge_delay = hedge_delay
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=5, max=30))
+    # Verification pages are not retried, the engine's circuit breaker handles them, and neither is cancellation
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=5, max=30),
+           retry=retry_if_exception_type(Exception) & retry_if_not_exception_type(ProxyForbiddenException))
     async def search(self, target: str, engine: Engine, abstract: str = None, **kwargs) -> Result:
         try:
             return await engine.search(target, **kwargs)
@@ -37,43 +58,227 @@ class Searcher(object):
                 return Result(title=target, content=[Schema(content=abstract, url=target)])
             raise e
 
-    async def aggregate_search(self, query: str, client: RequestClient, engines: list[EngineConfig], num: int = 10,
-                               **kwargs) -> Result:
-        total = sum(engine.weight for engine in engines)
-        nums = [max(1, math.ceil(cfg.weight / total * num * 1.5)) for cfg in engines]
+    async def _timed_search(self, query: str, engine: Engine, num: int, **kwargs) -> Result | None:
+        """
+        Search one engine through its circuit breaker and record its latency and failures, None when it failed.
+        The engine is called once: the breaker and the backup engine take the place of retries,
+        and every failure counts toward opening the circuit.
+        """
+        breaker = self.breakers.get(engine.NAME)
+        if not breaker.acquire():
+            self.logger.info(f"Circuit of engine {engine.NAME} is open, skipping it")
+            return None
+        start = time.monotonic()
+        try:
+            res = await engine.search(query, num=num, **kwargs)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            breaker.failure(forbidden=isinstance(e, ProxyForbiddenException))
+            self.stats.get(engine.NAME).record(time.monotonic() - start, error=e)
+            self.logger.error(f"Engine {engine.NAME} failed for {query}: {e}")
+            return None
+        breaker.success()
+        self.stats.get(engine.NAME).record(time.monotonic() - start)
+        return res
+
+    async def _engine_search(self, query: str, cfg: EngineConfig, num: int,
+                             **kwargs) -> tuple[str, Result | None]:
+        """
+        Search the configured engine, hedged with its backup when it has one.
+        Return the name of the engine that answered and its result.
+        """
+        if cfg.backup is None:
+            return cfg.engine.NAME, await self._timed_search(query, cfg.engine, num, **kwargs)
+        primary = asyncio.ensure_future(self._timed_search(query, cfg.engine, num, **kwargs))
+        names = {primary: cfg.engine.NAME}
+        try:
+            delay = self.stats.get(cfg.engine.NAME).percentile(self.hedge_quantile) or self.hedge_delay
+            done, pending = await asyncio.wait({primary}, timeout=delay)
+            if done and primary.result() is not None:
+                return cfg.engine.NAME, primary.result()
+            self.logger.info(f"Hedging engine {cfg.engine.NAME} with {cfg.backup.NAME} for {query}")
+            backup = asyncio.ensure_future(self._timed_search(query, cfg.backup, num, **kwargs))
+            names[backup] = cfg.backup.NAME
+            pending.add(backup)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.result() is not None:
+                        return names[task], task.result()
+            return cfg.engine.NAME, None
+        finally:
+            for task in names:
+                task.cancel()
+
+    async def _serp(self, query: str, engines: list[EngineConfig], num: int, timeout: float | None = None,
+                    **kwargs) -> tuple[list[Schema], dict[str, list[str]]]:
+        """
+        Query the engines with a result budget split by their adaptive weights.
+        Engines still running after `timeout` seconds are cancelled and the search goes on without them.
+        Return the deduplicated results and the URLs returned by each engine.
+        """
+        weights = self.stats.weights([cfg.engine.NAME for cfg in engines], [cfg.weight for cfg in engines])
+        total = sum(weights)
+        nums = [max(1, math.ceil(weight / total * num * 1.5)) for weight in weights]
         tasks = [
-            self.search(target=query, engine=cfg.engine, abstract=None, num=nums[i], **kwargs)
+            asyncio.ensure_future(self._engine_search(query, cfg, nums[i], **kwargs))
             for i, cfg in enumerate(engines)
         ]
-        results = await asyncio.gather(*tasks)
-        # Dedup
+        try:
+            done, pending = await asyncio.wait(tasks, timeout=timeout)
+        finally:
+            for task in tasks:
+                task.cancel()
+        if pending:
+            self.logger.info(f"SERP deadline reached with {len(pending)} engines pending for {query}")
+        results = [task.result() for task in tasks if task in done]
+        # Dedup on canonical URLs so that variants of a page are fetched once
         contents = {}
-        for res in results or []:
+        sources = {}
+        for name, res in results:
             for item in (res.content if res else []):
-                if hasattr(item, "url"):
-                    contents[item.url] = item
+                # Containers whose link selector matched nothing have no URL
+                if getattr(item, "url", None):
+                    url = canonicalize_url(item.url)
+                    contents[url] = item
+                    sources.setdefault(name, []).append(url)
+        return list(contents.values()), sources
+
+    def _record_yield(self, sources: dict[str, list[str]], result: Result):
+        ranked = {canonicalize_url(item.url) for item in result.content}
+        for name, urls in sources.items():
+            self.stats.get(name).record_yield(len(urls), sum(1 for url in urls if url in ranked))
+
+    def _split(self, url: str, preview: Result) -> list[tuple[str, str]]:
+        text = f"{preview.title}\n{preview.content[0].content if preview.content else ''}"
+        return [(chunk, url) for chunk in self.splitter.split_text(text)]
+
+    async def aggregate_search(self, query: str, client: RequestClient, engines: list[EngineConfig], num: int = 10,
+                               **kwargs) -> Result:
+        result = Result(title=query, content=[])
+        async for result in self.aggregate_search_stream(query, client, engines, num=num, interval=None, **kwargs):
+            pass
+        return result
+
+    async def aggregate_search_stream(self, query: str, client: RequestClient, engines: list[EngineConfig],
+                                      num: int = 10, interval: float | None = 0.5, deadline: float | None = None,
+                                      serp_deadline: float | None = None, min_previews: int | None = None,
+                                      min_chars: int | None = None,
+                                      **kwargs) -> AsyncIterator[Result]:
+        """
+        Yield SERP abstracts as soon as the engines answer, then re-ranked preview chunks as previews arrive.
+        - interval: minimum seconds between two re-ranked yields, None to only yield the final ranking
+        - deadline: seconds to wait for previews before the pending ones are cancelled
+        - serp_deadline: seconds to wait for the engines before the pending ones are cancelled
+        - min_previews: stop waiting once this many previews are collected
+        - min_chars: stop waiting once this many characters of preview content are collected
+        Pages whose preview is pending or was cut off are ranked by their SERP abstract instead.
+        The last yielded result is the complete ranking.
+        """
+        contents, sources = await self._serp(query, engines, num, timeout=serp_deadline, **kwargs)
         if not contents:
-            return Result(title=query, content=[])
-        contents = list(contents.values())
-        tasks = [
-            self.search(target=content.url, engine=Engine(client=client), abstract=content.abstract, **kwargs)
+            yield Result(title=query, content=[])
+            return
+        if interval is not None:
+            yield Result(title=query, content=[Schema(content=content.abstract, url=content.url)
+                                               for content in contents if getattr(content, "abstract", None)])
+        loop = asyncio.get_running_loop()
+        query_embedding = asyncio.ensure_future(self.embedder.embed_query(query))
+        # Pages stand in with their abstract until their preview arrives
+        abstracts = asyncio.ensure_future(self._abstracts(contents))
+        seen = SimHashIndex()
+        pending = {
+            asyncio.ensure_future(self._preview(content, client, seen, **kwargs)): content
             for content in contents
-        ]
-        previews = await asyncio.gather(*tasks, return_exceptions=True)
-        documents = []
-        for i, res in enumerate(previews):
-            if isinstance(res, Exception):
-                continue
-            text = f"{res.title}\n{res.content[0].content if res.content else ''}"
-            doc = Document(text=text, metadata={"url": contents[i].url})
-            doc.excluded_embed_metadata_keys = ["url"]
-            doc.excluded_llm_metadata_keys = ["url"]
-            documents.append(doc)
-        splitter = SentenceSplitter(chunk_size=512, chunk_overlap=128)
-        nodes = splitter.get_nodes_from_documents(documents)
-        documents = [Document(text=n.text, metadata={"url": n.metadata.get("url")}) for n in nodes]
-        index = _build_index(documents)
-        retriever = index.as_retriever(similarity_top_k=min(num, len(documents)))
-        nodes = retriever.retrieve(query)
+        }
+        deadline_at = loop.time() + deadline if deadline is not None else None
+        chunks, embeddings = [], []
+        previews, chars = 0, 0
+        last_yield, ranked = time.monotonic(), None
+
+        async def ranking() -> Result:
+            urls = {content.url for content in pending.values()}
+            abstract_chunks, abstract_embeddings = await abstracts
+            stand_ins = [i for i, (_, url) in enumerate(abstract_chunks) if url in urls]
+            return self._rank(query, chunks + [abstract_chunks[i] for i in stand_ins],
+                              list(embeddings) + [abstract_embeddings[i] for i in stand_ins],
+                              await query_embedding, num)
+
+        try:
+            while pending:
+                timeout = max(0.0, deadline_at - loop.time()) if deadline_at is not None else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.logger.info(f"Preview deadline reached with {len(pending)} pages pending")
+                    break
+                for future in done:
+                    pending.pop(future)
+                    new_chunks, new_embeddings = future.result()
+                    if not new_chunks:
+                        continue
+                    chunks.extend(new_chunks)
+                    embeddings.extend(new_embeddings)
+                    previews += 1
+                    chars += sum(len(chunk) for chunk, _ in new_chunks)
+                if ((min_previews is not None and previews >= min_previews)
+                        or (min_chars is not None and chars >= min_chars)):
+                    break
+                if interval is not None and time.monotonic() - last_yield >= interval:
+                    yield await ranking()
+                    last_yield, ranked = time.monotonic(), (len(chunks), len(pending))
+            for task in pending:
+                task.cancel()
+            result = await ranking()
+            self._record_yield(sources, result)
+            if ranked != (len(chunks), len(pending)):
+                yield result
+        finally:
+            for task in list(pending) + [query_embedding, abstracts]:
+                task.cancel()
+
+    async def _abstracts(self, contents: list[Schema]) -> tuple[list[tuple[str, str]], list]:
+        """
+        Split and embed the SERP abstracts of the pages, which stand in for previews not collected (yet).
+        """
+        chunks = []
+        for content in contents:
+            if getattr(content, "abstract", None):
+                chunks.extend(self._split(content.url, Result(title=content.url,
+                                                              content=[Schema(content=content.abstract)])))
+        return chunks, await self.embedder.embed([chunk for chunk, _ in chunks])
+
+    async def _preview(self, content: Schema, client: RequestClient, seen: SimHashIndex,
+                       **kwargs) -> tuple[list[tuple[str, str]], list]:
+        """
+        Fetch, split and embed one page, returning its (chunk, url) pairs and their embeddings.
+        Pages whose content is a near-duplicate of one already seen by this search are dropped before embedding.
+        """
+        try:
+            res = await self.search(target=content.url, engine=Engine(client=client),
+                                    abstract=getattr(content, "abstract", None), **kwargs)
+        except Exception:
+            return [], []
+        fingerprint, chunks = await asyncio.to_thread(self._fingerprint_split, content.url, res)
+        if fingerprint is not None and not seen.add_hash(fingerprint):
+            self.logger.info(f"Skipping near-duplicate content of {content.url}")
+            return [], []
+        return chunks, await self.embedder.embed([chunk for chunk, _ in chunks])
+
+    def _fingerprint_split(self, url: str, res: Result) -> tuple[int | None, list[tuple[str, str]]]:
+        """
+        SimHash of the page content and its chunks, both CPU bound so computed together in a worker thread.
+        """
+        fingerprint = simhash(res.content[0].content) if res.content and res.content[0].content else None
+        return fingerprint, self._split(url, res)
+
+    @staticmethod
+    def _rank(query: str, chunks: list[tuple[str, str]], embeddings: list, query_embedding: list[float],
+              num: int) -> Result:
+        if not chunks:
+            return Result(title=query, content=[])
+        ranker = VectorRanker(embeddings)
         return Result(title=query,
-                      content=[Schema(content=n.text, url=n.metadata.get("url")) for n in nodes])
+                      content=[Schema(content=chunks[i][0], url=chunks[i][1])
+                               for i, _ in ranker.top_k(query_embedding, num)])
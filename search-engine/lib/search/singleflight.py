@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+import uuid
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+from lib.search.sqlite import SharedSQLite
+
+T = TypeVar("T")
+
+
+class SingleFlight(object):
+    """
+    Coalesce concurrent calls with the same key into one in-flight call whose result is shared by every caller.
+    A caller being cancelled does not cancel the shared call for the others,
+    the shared call is only cancelled once every caller has been cancelled.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Future] = {}
+        self._waiters: dict[asyncio.Future, int] = {}
+
+    def __len__(self):
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            self._waiters[future] = 0
+            future.add_done_callback(lambda f: self._done(key, f))
+        self._waiters[future] += 1
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if self._waiters.get(future) == 1 and not future.done():
+                # Callers arriving while the cancelled call cleans up start a new one instead of joining it
+                if self._calls.get(key) is future:
+                    del self._calls[key]
+                future.cancel()
+            raise
+        finally:
+            if future in self._waiters:
+                self._waiters[future] -= 1
+
+    def _done(self, key: Hashable, future: asyncio.Future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        self._waiters.pop(future, None)
+        # Mark the exception as retrieved when every caller has gone away
+        if not future.cancelled():
+            future.exception()
+
+
+class SharedFlight(object):
+    """
+    Coalesce identical calls across worker processes through one SQLite file.
+    Each worker process serves one RPC at a time, so identical concurrent requests always land on different
+    processes: the first caller of a key runs the call and stores its encoded result, the others poll for it.
+    A caller that stops heartbeating for `lease` seconds (e.g. a crashed process) is replaced by a waiting one.
+    Results are only shared with the callers waiting for them, a later call of the same key runs again.
+    """
+
+    def __init__(self, path: str = None, lease: float = 10.0, poll: float = 0.1, ttl: float = 60):
+        self.path = path or os.path.join(tempfile.gettempdir(), "deepsearch-flights.sqlite")
+        self.lease = lease
+        self.poll = poll
+        self.ttl = ttl
+        self._db = SharedSQLite(self.path, schema=(
+            "CREATE TABLE IF NOT EXISTS flights ("
+            "key TEXT PRIMARY KEY, owner TEXT NOT NULL, payload BLOB, error TEXT, done INTEGER NOT NULL, "
+            "heartbeat REAL NOT NULL)",
+        ))
+
+    async def _claim(self, key: str) -> tuple[bool, str]:
+        """
+        Become the runner of `key` unless a live call of it exists, return whether it was claimed and the runner.
+        """
+        owner, now = uuid.uuid4().hex, time.time()
+        await self._db.aexecute("DELETE FROM flights WHERE done = 1 AND heartbeat < ?", (now - self.ttl,))
+        await self._db.aexecute(
+            "INSERT INTO flights VALUES (?, ?, NULL, NULL, 0, ?) ON CONFLICT (key) DO UPDATE SET "
+            "owner = excluded.owner, payload = NULL, error = NULL, done = 0, heartbeat = excluded.heartbeat "
+            "WHERE flights.done = 1 OR flights.heartbeat < ?",
+            (key, owner, now, now - self.lease),
+        )
+        rows = await self._db.aexecute("SELECT owner FROM flights WHERE key = ?", (key,))
+        runner = rows[0][0] if rows else None
+        return runner == owner, runner
+
+    async def _heartbeat(self, key: str, owner: str):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            await self._db.aexecute("UPDATE flights SET heartbeat = ? WHERE key = ? AND owner = ?",
+                                    (time.time(), key, owner))
+
+    async def _lead(self, key: str, owner: str, fn: Callable[[], Awaitable[T]], encode: Callable[[T], bytes]) -> T:
+        heartbeat = asyncio.ensure_future(self._heartbeat(key, owner))
+        try:
+            res = await fn()
+        except asyncio.CancelledError:
+            # Let a waiting caller take over
+            await asyncio.shield(self._db.aexecute("DELETE FROM flights WHERE key = ? AND owner = ?", (key, owner)))
+            raise
+        except Exception as e:
+            await self._db.aexecute("UPDATE flights SET error = ?, done = 1, heartbeat = ? WHERE key = ? AND owner = ?",
+                                    (str(e) or e.__class__.__name__, time.time(), key, owner))
+            raise
+        finally:
+            heartbeat.cancel()
+        await self._db.aexecute("UPDATE flights SET payload = ?, done = 1, heartbeat = ? WHERE key = ? AND owner = ?",
+                                (encode(res), time.time(), key, owner))
+        return res
+
+    async def do(self, key: bytes, fn: Callable[[], Awaitable[T]], encode: Callable[[T], bytes],
+                 decode: Callable[[bytes], T]) -> T:
+        key = hashlib.sha1(key).hexdigest()
+        while True:
+            claimed, runner = await self._claim(key)
+            if claimed:
+                return await self._lead(key, runner, fn, encode)
+            while True:
+                await asyncio.sleep(self.poll)
+                rows = await self._db.aexecute(
+                    "SELECT owner, payload, error, done, heartbeat FROM flights WHERE key = ?", (key,)
+                )
+                if not rows:
+                    break
+                owner, payload, error, done, heartbeat = rows[0]
+                if done:
+                    if error is not None:
+                        raise RuntimeError(error)
+                    return decode(payload)
+                if heartbeat < time.time() - self.lease:
+                    break
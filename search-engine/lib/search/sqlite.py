@@ -0,0 +1,33 @@
+import asyncio
+import os
+import sqlite3
+import threading
+
+
+class SharedSQLite(object):
+    """
+    SQLite file shared by the worker processes, in WAL mode with one connection per process.
+    Statements are serialized by a lock, `execute` blocks and `aexecute` runs it in a worker thread,
+    as the file lock may be held by another process for up to `timeout` seconds.
+    - schema: statements run once when connecting, e.g. CREATE TABLE IF NOT EXISTS
+    """
+
+    def __init__(self, path: str, schema: tuple[str, ...] = (), timeout: float = 30):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        for statement in schema:
+            self._db.execute(statement)
+
+    def execute(self, sql: str, params: tuple = ()) -> list[tuple]:
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    async def aexecute(self, sql: str, params: tuple = ()) -> list[tuple]:
+        return await asyncio.to_thread(self.execute, sql, params)
+
@@ -0,0 +1,108 @@
+import threading
+from collections import deque
+
+from lib.search.exception import ProxyForbiddenException
+
+
+class EngineStats(object):
+    """
+    Recent behaviour of one search engine, as exponentially weighted moving averages.
+    - latency: seconds per search, retries included
+    - failure: rate of searches that failed
+    - forbidden: rate of searches blocked by a verification page
+    - yield_: rate of returned results that survived dedup and ranking
+    The last `window` latencies are also kept to compute percentiles.
+    """
+
+    def __init__(self, alpha: float = 0.2, window: int = 100):
+        self.alpha = alpha
+        self.samples = 0
+        self.latency: float | None = None
+        self.failure = 0.0
+        self.forbidden = 0.0
+        self.yield_: float | None = None
+        self.latencies = deque(maxlen=window)
+
+    def _ewma(self, current: float | None, value: float) -> float:
+        return value if current is None else (1 - self.alpha) * current + self.alpha * value
+
+    def record(self, latency: float, error: BaseException = None):
+        self.samples += 1
+        self.latency = self._ewma(self.latency, latency)
+        if not error:
+            self.latencies.append(latency)
+        self.failure = self._ewma(self.failure, 1.0 if error else 0.0)
+        self.forbidden = self._ewma(self.forbidden, 1.0 if isinstance(error, ProxyForbiddenException) else 0.0)
+
+    def record_yield(self, returned: int, survived: int):
+        if returned > 0:
+            self.yield_ = self._ewma(self.yield_, survived / returned)
+
+    def percentile(self, q: float) -> float | None:
+        """
+        Latency percentile of recent successful searches, q in [0, 1].
+        """
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def score(self) -> float | None:
+        """
+        Higher for fast, reliable and productive engines, None without enough samples.
+        """
+        if self.samples < 3 or self.latency is None:
+            return None
+        productivity = 0.5 + (self.yield_ if self.yield_ is not None else 0.5)
+        reliability = (1 - self.failure) * (1 - self.forbidden)
+        return productivity * reliability / max(self.latency, 0.5)
+
+    def to_dict(self) -> dict[str, float]:
+        return {
+            "samples": self.samples,
+            "latency": self.latency or 0.0,
+            "failure": self.failure,
+            "forbidden": self.forbidden,
+            "yield": self.yield_ or 0.0,
+            "score": self.score() or 0.0,
+        }
+
+
+class EngineStatsRegistry(object):
+    """
+    Process-wide engine statistics, used to shift the result budget toward fast and productive engines.
+    - min_factor, max_factor: bounds of the adaptive factor applied to the configured weight,
+      so that slow engines still get some traffic and can recover
+    """
+
+    def __init__(self, min_factor: float = 0.25, max_factor: float = 4.0):
+        self.min_factor = min_factor
+        self.max_factor = max_factor
+        self._stats: dict[str, EngineStats] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> EngineStats:
+        with self._lock:
+            if name not in self._stats:
+                self._stats[name] = EngineStats()
+            return self._stats[name]
+
+    def weights(self, names: list[str], weights: list[float]) -> list[float]:
+        """
+        Scale the configured weights by each engine's score relative to the average score.
+        """
+        scores = [self.get(name).score() for name in names]
+        known = [score for score in scores if score is not None]
+        mean = sum(known) / len(known) if known else 0
+        if not mean:
+            return list(weights)
+        # Engines without enough samples are treated as average
+        scores = [mean if score is None else score for score in scores]
+        return [
+            weight * min(self.max_factor, max(self.min_factor, score / mean))
+            for weight, score in zip(weights, scores)
+        ]
+
+    def to_dict(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {name: stats.to_dict() for name, stats in self._stats.items()}
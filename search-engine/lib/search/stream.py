@@ -0,0 +1,51 @@
+import os
+import tempfile
+import time
+import uuid
+
+from lib.search.sqlite import SharedSQLite
+
+
+class StreamStore(object):
+    """
+    SQLite-backed buffer of streamed search snapshots.
+    The server runs several worker processes and consecutive RPCs of one client may land on different workers,
+    so the worker producing a stream publishes every snapshot here and any worker can serve the next one.
+    - ttl: seconds after which finished or abandoned streams are removed
+    """
+
+    def __init__(self, path: str = None, ttl: float = 600):
+        self.path = path or os.path.join(tempfile.gettempdir(), "deepsearch-streams.sqlite")
+        self.ttl = ttl
+        self._db = SharedSQLite(self.path, schema=(
+            "CREATE TABLE IF NOT EXISTS streams ("
+            "id TEXT PRIMARY KEY, seq INTEGER NOT NULL, payload BLOB, done INTEGER NOT NULL, "
+            "error TEXT, updated REAL NOT NULL)",
+        ))
+
+    async def create(self) -> str:
+        stream_id = uuid.uuid4().hex
+        now = time.time()
+        await self._db.aexecute("DELETE FROM streams WHERE updated < ?", (now - self.ttl,))
+        await self._db.aexecute("INSERT INTO streams VALUES (?, 0, NULL, 0, NULL, ?)", (stream_id, now))
+        return stream_id
+
+    async def publish(self, stream_id: str, payload: bytes) -> None:
+        await self._db.aexecute("UPDATE streams SET seq = seq + 1, payload = ?, updated = ? WHERE id = ?",
+                                (payload, time.time(), stream_id))
+
+    async def finish(self, stream_id: str, error: str = None) -> None:
+        await self._db.aexecute("UPDATE streams SET done = 1, error = ?, updated = ? WHERE id = ?",
+                                (error, time.time(), stream_id))
+
+    async def next(self, stream_id: str, after: int) -> tuple[int, bytes | None, bool, str | None] | None:
+        """
+        Return the latest snapshot if it is newer than `after`, without waiting,
+        so that a polling client never holds a worker process while the stream is idle.
+        Return (seq, payload, done, error), or None for an unknown stream.
+        """
+        rows = await self._db.aexecute("SELECT seq, payload, done, error FROM streams WHERE id = ?", (stream_id,))
+        if not rows:
+            return None
+        seq, payload, done, error = rows[0]
+        return seq, payload if seq > after else None, bool(done), error
@@ -1,6 +1,11 @@
+import asyncio
+import hashlib
+import logging
+import time
+
 from dotenv import load_dotenv
 from zero import ZeroServer
-from msgspec import Struct
+from msgspec import Struct, msgpack
 import os
 import sys
 
@@ -10,7 +15,10 @@ from lib.search.request import RequestClient
 from lib import Searcher
 from lib.search.engines import *
 from lib.search.presets.base import Preference
+from lib.search.cancel import CancelRegistry
 from lib.search.presets.default import DefaultPreset
+from lib.search.singleflight import SharedFlight
+from lib.search.stream import StreamStore
 
 app = ZeroServer(port=5559)
 
@@ -20,6 +28,10 @@ class SearchConfig(Struct):
     preset: str = "default"
     preference: str = "balance"
     kwargs: dict = {}
+    # Set by clients that may cancel the call, see `cancel`
+    request_id: str | None = None
+    # Epoch seconds after which the client no longer waits for the result
+    deadline: float | None = None
 
 
 class Result(Struct):
@@ -27,6 +39,19 @@ class Result(Struct):
     content: list[dict[str, str]]
 
 
+class StreamCursor(Struct):
+    stream_id: str
+    seq: int = 0
+
+
+class StreamChunk(Struct):
+    stream_id: str
+    seq: int
+    done: bool
+    result: Result | None = None
+    error: str | None = None
+
+
 @app.register_rpc
 async def echo(msg: str) -> str:
     return msg
@@ -38,6 +63,11 @@ available_presets = {
 
 client = RequestClient()
 searcher = Searcher()
+streams = StreamStore()
+search_flight = SharedFlight()
+cancels = CancelRegistry()
+stream_tasks: set[asyncio.Task] = set()
+logger = logging.getLogger(__name__)
 
 
 @app.register_rpc
@@ -48,9 +78,92 @@ async def fetch(url: str) -> Result:
 
 @app.register_rpc
 async def search(config: SearchConfig) -> Result:
-    res = await (available_presets[config.preset.lower()](searcher)
-                 .search(config.target, Preference(config.preference.lower()), client=client))
-    return Result(title=res.title, content=[item.__dict__ for item in res.content])
+    async def run() -> Result:
+        res = await (available_presets[config.preset.lower()](searcher)
+                     .search(config.target, Preference(config.preference.lower()), client=client))
+        return Result(title=res.title, content=[item.__dict__ for item in res.content])
+
+    # Identical concurrent searches share one run, whichever worker process they land on
+    key = msgpack.encode([config.target, config.preset.lower(), config.preference.lower(), config.kwargs])
+    work = asyncio.ensure_future(search_flight.do(
+        key, run, encode=msgpack.encode, decode=lambda payload: msgpack.decode(payload, type=Result)
+    ))
+    watcher = asyncio.ensure_future(cancels.watch(config.request_id, work)) if config.request_id else None
+    timeout = max(0.0, config.deadline - time.time()) if config.deadline else None
+    try:
+        res = await asyncio.wait_for(work, timeout)
+    except (asyncio.CancelledError, asyncio.TimeoutError):
+        if not work.cancelled() or asyncio.current_task().cancelling():
+            raise
+        logger.info(f"Search for {config.target} was cancelled or passed its deadline")
+        return Result(title=config.target, content=[])
+    finally:
+        if watcher:
+            watcher.cancel()
+    return res
+
+
+@app.register_rpc
+async def cancel(request_id: str) -> bool:
+    await cancels.cancel(request_id)
+    return True
+
+
+@app.register_rpc
+async def search_stream(config: SearchConfig) -> StreamChunk:
+    """
+    Start a streaming search and return its cursor.
+    Poll `search_stream_next` with the last seen `seq` until `done`, each result replaces the previous one.
+    `search_stream_next` answers at once, so clients sleep between polls that return no new result.
+    """
+    preset = available_presets[config.preset.lower()](searcher)
+    preference = Preference(config.preference.lower())
+    stream_id = await streams.create()
+
+    async def produce():
+        try:
+            async for res in preset.search_stream(config.target, preference, client=client):
+                await streams.publish(stream_id, msgpack.encode(
+                    Result(title=res.title, content=[item.__dict__ for item in res.content])))
+            await streams.finish(stream_id)
+        except Exception as e:
+            logger.error(f"Error occurred while streaming search: {e}")
+            await streams.finish(stream_id, error=str(e))
+
+    task = asyncio.create_task(produce())
+    stream_tasks.add(task)
+    task.add_done_callback(stream_tasks.discard)
+    return StreamChunk(stream_id=stream_id, seq=0, done=False)
+
+
+@app.register_rpc
+async def search_stream_next(cursor: StreamCursor) -> StreamChunk:
+    res = await streams.next(cursor.stream_id, cursor.seq)
+    if res is None:
+        return StreamChunk(stream_id=cursor.stream_id, seq=cursor.seq, done=True, error="Stream not found")
+    seq, payload, done, error = res
+    return StreamChunk(stream_id=cursor.stream_id, seq=seq, done=done, error=error,
+                       result=msgpack.decode(payload, type=Result) if payload else None)
+
+
+@app.register_rpc
+async def embedding_cache_stats() -> dict[str, float]:
+    cache = searcher.embedding.cache
+    # Reads the SQLite index, which another process may hold locked
+    return await asyncio.to_thread(cache.stats) if cache else {}
+
+
+@app.register_rpc
+async def browser_pool_stats() -> dict[str, float]:
+    return client.pool.stats()
+
+
+@app.register_rpc
+async def engine_stats() -> dict[str, dict[str, float | str]]:
+    stats = searcher.stats.to_dict()
+    for name, state in searcher.breakers.to_dict().items():
+        stats.setdefault(name, {})["circuit"] = state
+    return stats
 
 
 @app.register_rpc
@@ -58,6 +171,12 @@ async def list_available_engines() -> dict[str, str]:
     return {preset: available_presets[preset].DESCRIPTION for preset in available_presets.keys()}
 
 
+@app.register_rpc
+async def engines_version() -> str:
+    """Hash of the available engines, clients refresh their cached list when it changes."""
+    return hashlib.sha1(msgpack.encode(sorted((await list_available_engines()).items()))).hexdigest()
+
+
 if __name__ == '__main__':
     load_dotenv()
     app.run(workers=2)
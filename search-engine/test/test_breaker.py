@@ -0,0 +1,37 @@
+import time
+
+from lib.search.breaker import CircuitBreaker
+
+
+def test_open_after_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    assert breaker.acquire()
+    breaker.failure()
+    assert breaker.acquire()
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.acquire()
+
+
+def test_open_on_forbidden():
+    breaker = CircuitBreaker(failure_threshold=3, forbidden_threshold=1)
+    breaker.failure(forbidden=True)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.failure()
+    time.sleep(0.02)
+    assert breaker.acquire()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.acquire()
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.reset_timeout == 0.02
+    time.sleep(0.03)
+    assert breaker.acquire()
+    breaker.success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.reset_timeout == 0.01
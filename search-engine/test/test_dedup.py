@@ -0,0 +1,28 @@
+from lib.search.dedup import SimHashIndex, canonicalize_url
+
+
+def test_canonicalize_url():
+    expected = "https://example.com/a/b?a=1&b=2"
+    for url in [
+        "http://www.example.com/a/b/?utm_source=x&b=2&a=1#top",
+        "https://m.example.com/a/b?a=1&b=2",
+        "https://example.com/a/b/amp/?a=1&b=2&fbclid=abc",
+    ]:
+        assert canonicalize_url(url) == expected
+    assert canonicalize_url("https://en.m.wikipedia.org/wiki/X") == "https://en.wikipedia.org/wiki/X"
+    assert canonicalize_url("https://example.co.uk/news.amp.html") == "https://example.co.uk/news.html"
+    assert canonicalize_url("https://example.com/a") != canonicalize_url("https://example.com/b")
+
+
+def test_simhash_index():
+    page = "The quick brown fox jumps over the lazy dog near the river bank. " * 20
+    index = SimHashIndex()
+    assert index.add(page + "Copyright 2024")
+    assert not index.add(page + "Copyright 2025")
+    assert index.add("东京明天的天气预报显示多云，最高气温二十度，最低气温十二度。" * 5)
+
+
+def test_canonicalize_malformed_url():
+    assert canonicalize_url("http://a.com:abc/") == "http://a.com:abc/"
+    assert canonicalize_url("http://a.com:99999/") == "http://a.com:99999/"
+    assert canonicalize_url("https://[::1]:8080/a/") == "https://[::1]:8080/a"
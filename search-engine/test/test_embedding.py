@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+import pytest
+
+from lib.search.embedding import BatchEmbedder
+
+
+class SlowEmbedding(object):
+    model_name = "slow"
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.batches = []
+
+    def get_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        self.batches.append(len(texts))
+        time.sleep(self.delay)
+        return [[float(len(text))] for text in texts]
+
+
+@pytest.mark.asyncio
+async def test_merge_while_busy():
+    service = SlowEmbedding(delay=0.2)
+    embedder = BatchEmbedder(service, max_wait=0.005)
+
+    async def caller(i: int):
+        await asyncio.sleep(i * 0.002)
+        return await embedder.embed([str(i) * (i + 1)] * 3)
+
+    first = asyncio.ensure_future(embedder.embed(["a"] * 3))
+    await asyncio.sleep(0.02)
+    results = await asyncio.gather(first, *[caller(i) for i in range(39)])
+    # One batch was running when the other callers arrived, they all form the next one
+    assert service.batches == [3, 117]
+    assert results[0] == [[1.0]] * 3
+    assert results[5] == [[5.0]] * 3
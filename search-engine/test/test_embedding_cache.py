@@ -0,0 +1,58 @@
+import time
+
+import numpy as np
+
+from lib.search.embedding_cache import EmbeddingCache
+
+
+def vector(i: int) -> list[float]:
+    return [float(i)] * 4
+
+
+def test_lru_eviction(tmp_path):
+    # Room for three 4-dimensional vectors, each with its tag
+    cache = EmbeddingCache(str(tmp_path), max_bytes=3 * (4 * 4 + 8))
+    keys = [EmbeddingCache.key("model", str(i)) for i in range(4)]
+    for i in range(3):
+        cache.put_many({keys[i]: vector(i)})
+        time.sleep(0.01)
+    assert cache.capacity == 3
+    # Reading the oldest entry makes the second one the least recently used
+    assert set(cache.get_many([keys[0]])) == {keys[0]}
+    time.sleep(0.01)
+    cache.put_many({keys[3]: vector(3)})
+    found = cache.get_many(keys)
+    assert set(found) == {keys[0], keys[2], keys[3]}
+    np.testing.assert_array_equal(found[keys[3]], vector(3))
+    stats = cache.stats()
+    assert stats["entries"] == 3
+    assert stats["hits"] == 4
+    assert stats["misses"] == 1
+
+
+def test_shared_between_instances(tmp_path):
+    first = EmbeddingCache(str(tmp_path), max_bytes=1024)
+    # Opened before anything is stored, so before the vector files exist
+    second = EmbeddingCache(str(tmp_path), max_bytes=1024)
+    key = EmbeddingCache.key("model", "first")
+    first.put_many({key: vector(1)})
+    np.testing.assert_array_equal(second.get_many([key])[key], vector(1))
+
+    other = EmbeddingCache.key("model", "second")
+    second.put_many({other: vector(2)})
+    third = EmbeddingCache(str(tmp_path), max_bytes=1024)
+    found = third.get_many([key, other])
+    np.testing.assert_array_equal(found[other], vector(2))
+    assert len(found) == 2
+
+
+def test_late_init_keeps_vectors(tmp_path):
+    first = EmbeddingCache(str(tmp_path), max_bytes=1 << 12)
+    # Opened before any vector was stored, so it initializes the files itself on its first write
+    second = EmbeddingCache(str(tmp_path), max_bytes=1 << 12)
+    keys = [EmbeddingCache.key("model", str(i)) for i in range(1, 3)]
+    first.put_many({keys[0]: vector(1)})
+    second.put_many({keys[1]: vector(2)})
+    found = first.get_many(keys)
+    np.testing.assert_array_equal(found[keys[0]], vector(1))
+    np.testing.assert_array_equal(found[keys[1]], vector(2))
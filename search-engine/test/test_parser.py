@@ -0,0 +1,15 @@
+from lib.search.engines.base import Parser
+
+
+def title(html: str) -> str:
+    return Parser(html=html, markdown="").title()
+
+
+def test_title():
+    assert title("<html><head><title>Plain</title></head><body><p>text</p></body></html>") == "Plain"
+    assert title("\ufeff<html><head><title>BOM</title></head><body></body></html>") == "BOM"
+    # lxml opens <body> at the <div>, the title is only found in the full tree
+    assert title("<div>banner</div><title>Late</title><p>text</p>") == "Late"
+    big = "<html><head>" + "<meta name='x' content='y'>" * 40000 + "<title>Big</title></head><body></body></html>"
+    assert title(big) == "Big"
+    assert title("<html><head></head><body>no title</body></html>") == ""
@@ -0,0 +1,21 @@
+import numpy as np
+
+from lib.search.ranker import VectorRanker
+
+
+def test_top_k_order():
+    ranker = VectorRanker([[1, 0], [0, 1], [1, 1], [-1, 0]])
+    res = ranker.top_k([1, 0.1], k=2)
+    assert [i for i, _ in res] == [0, 2]
+    assert res[0][1] >= res[1][1]
+
+
+def test_top_k_bounds():
+    ranker = VectorRanker(np.eye(3))
+    assert ranker.top_k([1, 0, 0], k=0) == []
+    assert [i for i, _ in ranker.top_k([0, 0, 1], k=10)] == [2, 0, 1]
+
+
+def test_zero_vectors():
+    ranker = VectorRanker([[0, 0], [1, 0]])
+    assert ranker.top_k([0, 0], k=2)[0][1] == 0
@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+from lib.search.engines.base import Result, Schema
+from lib.search.searcher import EngineConfig, Searcher
+
+
+class FakeEmbedding(object):
+    """In-memory stand-in for EmbeddingService, so that tests neither load a model nor write a cache."""
+    model_name = "fake"
+
+    def __init__(self):
+        self.model = self
+
+    def get_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def get_query_embedding(self, query: str) -> list[float]:
+        return [float(len(query)), 1.0]
+
+
+class SlowEngine(object):
+    NAME = "slow"
+
+    def __init__(self):
+        self.calls = 0
+        self.started = asyncio.Event()
+
+    async def search(self, target: str, **kwargs):
+        self.calls += 1
+        self.started.set()
+        await asyncio.sleep(10)
+
+
+class StaticEngine(object):
+    NAME = "static"
+
+    def __init__(self, content: list[Schema]):
+        self.content = content
+
+    async def search(self, target: str, **kwargs) -> Result:
+        return Result(title=target, content=self.content)
+
+
+@pytest.mark.asyncio
+async def test_cancel_search():
+    engine = SlowEngine()
+    task = asyncio.ensure_future(Searcher(embedding=FakeEmbedding()).search("hello", engine))
+    await engine.started.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(task, 1)
+    assert engine.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_serp_skips_missing_urls():
+    engine = StaticEngine([Schema(url=None, abstract="no link"), Schema(url="https://www.a.com/x/", abstract="x")])
+    contents, sources = await Searcher(embedding=FakeEmbedding())._serp("hello", [EngineConfig(engine)], 10)
+    assert [item.url for item in contents] == ["https://www.a.com/x/"]
+    assert sources == {"static": ["https://a.com/x"]}
+
+
+class FailingEngine(object):
+    NAME = "failing"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def search(self, target: str, **kwargs):
+        self.calls += 1
+        raise RuntimeError("blocked")
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_skips_engine():
+    searcher = Searcher(embedding=FakeEmbedding())
+    engine = FailingEngine()
+    threshold = searcher.breakers.get(engine.NAME).failure_threshold
+    for _ in range(threshold):
+        assert await asyncio.wait_for(searcher._timed_search("hello", engine, 10), 1) is None
+    # Called once per search, without retries
+    assert engine.calls == threshold
+    assert await searcher._timed_search("hello", engine, 10) is None
+    assert engine.calls == threshold
+
+
+@pytest.mark.asyncio
+async def test_hedge_with_backup():
+    searcher = Searcher(embedding=FakeEmbedding(), hedge_delay=0.05)
+    primary = SlowEngine()
+    backup = StaticEngine([Schema(url="https://a.com/x", abstract="x")])
+    name, res = await asyncio.wait_for(
+        searcher._engine_search("hello", EngineConfig(primary, backup=backup), 10), 1
+    )
+    assert name == "static"
+    assert [item.url for item in res.content] == ["https://a.com/x"]
+    assert primary.calls == 1
+
+
+def stalled_preview(searcher: Searcher, stalled_url: str):
+    """Preview double that answers at once, except for `stalled_url` which never answers in time."""
+
+    async def preview(content, client, seen, **kwargs):
+        if content.url == stalled_url:
+            await asyncio.sleep(10)
+        chunks = [("preview x", content.url)]
+        return chunks, await searcher.embedder.embed([chunk for chunk, _ in chunks])
+
+    return preview
+
+
+@pytest.mark.asyncio
+async def test_stream_ranks_pending_abstracts():
+    searcher = Searcher(embedding=FakeEmbedding())
+    engine = StaticEngine([Schema(url="https://a.com/x", abstract="abstract x"),
+                           Schema(url="https://b.com/y", abstract="abstract y")])
+    searcher._preview = stalled_preview(searcher, "https://b.com/y")
+    stream = searcher.aggregate_search_stream("hello", None, [EngineConfig(engine)], interval=0, deadline=0.5)
+    results = [result async for result in stream]
+    # SERP abstracts, then the first preview ranked with the pending page's abstract, which the cut-off does not change
+    assert len(results) == 2
+    assert [item.content for item in results[1].content if item.url == "https://a.com/x"] == ["preview x"]
+    assert ["abstract y" in item.content for item in results[1].content if item.url == "https://b.com/y"] == [True]
+
+
+@pytest.mark.asyncio
+async def test_stream_deadlines():
+    searcher = Searcher(embedding=FakeEmbedding())
+    slow = SlowEngine()
+    engine = StaticEngine([Schema(url="https://a.com/x", abstract="abstract x"),
+                           Schema(url="https://b.com/y", abstract="abstract y")])
+    searcher._preview = stalled_preview(searcher, "https://b.com/y")
+    # The slow engine is cut off by the SERP deadline, the slow preview by the early cutoff
+    result = await asyncio.wait_for(
+        searcher.aggregate_search("hello", None, [EngineConfig(slow), EngineConfig(engine)],
+                                  serp_deadline=0.2, min_previews=1), 2
+    )
+    assert slow.calls == 1
+    assert sorted(item.url for item in result.content) == ["https://a.com/x", "https://b.com/y"]
+    assert [item.content for item in result.content if item.url == "https://a.com/x"] == ["preview x"]
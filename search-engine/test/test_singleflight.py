@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from lib.search.singleflight import SharedFlight, SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_coalesce():
+    flight = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    res = await asyncio.gather(*[flight.do("key", fetch) for _ in range(5)])
+    assert res == [1] * 5
+    assert len(flight) == 0
+    assert await flight.do("key", fetch) == 2
+
+
+@pytest.mark.asyncio
+async def test_cancel_one_caller():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    first = asyncio.ensure_future(flight.do("key", fetch))
+    second = asyncio.ensure_future(flight.do("key", fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == "ok"
+
+
+@pytest.mark.asyncio
+async def test_cancel_all_callers():
+    flight = SingleFlight()
+    started = asyncio.Event()
+
+    async def fetch():
+        started.set()
+        await asyncio.sleep(10)
+
+    caller = asyncio.ensure_future(flight.do("key", fetch))
+    await started.wait()
+    caller.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await caller
+    await asyncio.sleep(0)
+    assert len(flight) == 0
+
+
+@pytest.mark.asyncio
+async def test_join_after_cancel():
+    flight = SingleFlight()
+    started = asyncio.Event()
+
+    async def fetch():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            # Slow cleanup, e.g. recycling a browser session
+            await asyncio.sleep(0.05)
+            raise
+        return "ok"
+
+    async def fast():
+        return "ok"
+
+    first = asyncio.ensure_future(flight.do("key", fetch))
+    await started.wait()
+    first.cancel()
+    await asyncio.sleep(0.01)
+    assert await flight.do("key", fast) == "ok"
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+
+@pytest.mark.asyncio
+async def test_shared_flight(tmp_path):
+    # One instance per worker process, sharing the same file
+    path = str(tmp_path / "flights.sqlite")
+    first, second = SharedFlight(path, poll=0.01), SharedFlight(path, poll=0.01)
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        return "ok"
+
+    encode, decode = str.encode, bytes.decode
+    res = await asyncio.gather(first.do(b"key", fetch, encode, decode), second.do(b"key", fetch, encode, decode))
+    assert res == ["ok", "ok"]
+    assert calls == 1
+    # Finished calls are not served again
+    assert await first.do(b"key", fetch, encode, decode) == "ok"
+    assert calls == 2
+
+    # A waiting caller takes over when the running one is cancelled
+    leader = asyncio.ensure_future(first.do(b"other", fetch, encode, decode))
+    await asyncio.sleep(0.02)
+    follower = asyncio.ensure_future(second.do(b"other", fetch, encode, decode))
+    await asyncio.sleep(0.02)
+    leader.cancel()
+    assert await follower == "ok"
+    assert calls == 4